@@ -1,16 +1,19 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from .json_provider import FastJSONProvider
 
 db = SQLAlchemy()
 migrate = Migrate()
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////tmp/app.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     db.init_app(app)
+    migrate.init_app(app, db)
     
     from .routes import main
     app.register_blueprint(main)
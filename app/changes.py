@@ -0,0 +1,138 @@
+import os
+from datetime import datetime
+from sqlalchemy import event, insert, select, delete, func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from .models import db, Application, ApplicationInstance, System, StatusChange
+from .rollups import apply_transitions, application_rollups
+
+CHANGE_LOG_RETENTION = int(os.environ.get('CHANGE_LOG_RETENTION', 100000))
+MAX_CHANGES_PAGE = int(os.environ.get('MAX_CHANGES_PAGE', 5000))
+
+# (model, tracked attribute, entity name) for transitions captured on flush
+TRACKED = [
+    (ApplicationInstance, 'status', 'instance'),
+    (Application, 'state', 'application'),
+    (System, 'status', 'system'),
+]
+
+
+def record_changes(rows, session=None):
+    """Append transition rows (dicts of StatusChange columns) in one executemany."""
+    if rows:
+        (session or db.session).connection().execute(insert(StatusChange.__table__), rows)
+
+
+def record_instance_statuses(updates, session=None):
+    """Log instance status transitions for a batch of {'id', 'status'} mappings.
+
+    Used by writers that bypass the unit of work; the previous statuses are
+    read in one query before the batch is applied, and the status rollups
+    are adjusted to match. Returns the rows logged.
+    """
+    session = session or db.session
+    updates = [u for u in updates if 'status' in u]
+    if not updates:
+        return []
+    current = {}
+    ids = list({u['id'] for u in updates})
+    for i in range(0, len(ids), 500):
+        current.update((instance_id, (application_id, status)) for instance_id, application_id, status in
+                       session.execute(select(ApplicationInstance.id, ApplicationInstance.application_id,
+                                              ApplicationInstance.status)
+                                       .where(ApplicationInstance.id.in_(ids[i:i + 500]))))
+
+    # Walk the batch in order so an instance that flaps within it logs every step
+    now = datetime.utcnow()
+    rows = []
+    for update in updates:
+        if update['id'] not in current:
+            continue
+        application_id, status = current[update['id']]
+        if status != update['status']:
+            rows.append({
+                'entity': 'instance',
+                'entity_id': update['id'],
+                'application_id': application_id,
+                'field': 'status',
+                'old_value': status,
+                'new_value': update['status'],
+                'changed_at': now
+            })
+            current[update['id']] = (application_id, update['status'])
+    record_changes(rows, session)
+    apply_transitions(rows, session)
+    return rows
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_on_flush(session, flush_context):
+    now = datetime.utcnow()
+    rows = []
+    for obj in session.dirty:
+        for model, attr, entity in TRACKED:
+            if not isinstance(obj, model):
+                continue
+            history = get_history(obj, attr)
+            if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                rows.append({
+                    'entity': entity,
+                    'entity_id': obj.id,
+                    'application_id': obj.id if entity == 'application' else getattr(obj, 'application_id', None),
+                    'field': attr,
+                    'old_value': history.deleted[0],
+                    'new_value': history.added[0],
+                    'changed_at': now
+                })
+    record_changes(rows, session)
+
+
+def prune_changes(retention=CHANGE_LOG_RETENTION, session=None):
+    """Drop log entries older than the newest `retention` rows."""
+    session = session or db.session
+    latest = session.execute(select(func.max(StatusChange.id))).scalar() or 0
+    if latest > retention:
+        session.execute(delete(StatusChange.__table__).where(StatusChange.id <= latest - retention))
+
+
+def changes_since(since, limit=MAX_CHANGES_PAGE, session=None):
+    """Return what changed after log id `since`, collapsed to the latest value per entity.
+
+    The result carries the version to pass as the next `since`. `reset` is
+    set when `since` predates the retained log and the client must reload
+    everything; `more` is set when the page was cut at `limit` rows.
+    `rollups` holds the current rollup of every application whose instances
+    changed, so clients can update application badges without re-probing.
+    """
+    session = session or db.session
+    first, latest = session.execute(select(func.min(StatusChange.id), func.max(StatusChange.id))).one()
+    latest = latest or 0
+    if since is None or since > latest:
+        return {'version': latest, 'reset': since is not None, 'more': False,
+                'instances': [], 'applications': [], 'systems': [], 'rollups': []}
+
+    rows = session.execute(
+        select(StatusChange.id, StatusChange.entity, StatusChange.entity_id, StatusChange.application_id,
+               StatusChange.field, StatusChange.new_value, StatusChange.changed_at)
+        .where(StatusChange.id > since)
+        .order_by(StatusChange.id)
+        .limit(limit)).all()
+
+    latest_by_entity = {}
+    for change_id, entity, entity_id, application_id, field, value, changed_at in rows:
+        change = {'id': entity_id, field: value, 'changed_at': changed_at}
+        if entity == 'instance':
+            change['application_id'] = application_id
+        latest_by_entity[(entity, entity_id)] = change
+    instances = [c for (entity, _), c in latest_by_entity.items() if entity == 'instance']
+    app_ids = {c['application_id'] for c in instances}
+    rollups = application_rollups(app_ids=app_ids, session=session) if app_ids else []
+    return {
+        'version': rows[-1][0] if rows else since,
+        'reset': first is not None and since < first - 1,
+        'more': len(rows) == limit,
+        'instances': instances,
+        'applications': [c for (entity, _), c in latest_by_entity.items() if entity == 'application'],
+        'systems': [c for (entity, _), c in latest_by_entity.items() if entity == 'system'],
+        'rollups': rollups,
+    }
@@ -0,0 +1,149 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+from .models import db, ApplicationInstance
+from .probe import get_executor, rollup_status
+from .status_sink import SQLStatusSink
+
+CHECK_BATCH_SIZE = int(os.environ.get('CHECK_BATCH_SIZE', 1000))
+
+
+class StatusCheckError(ValueError):
+    """Raised when a bulk status check request names no valid targets."""
+
+
+def _ids(body, key):
+    value = body.get(key)
+    if value is None or value == 'all':
+        return value
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise StatusCheckError(f"'{key}' must be a list of ids or \"all\"")
+    return value
+
+
+def resolve_targets(body):
+    """Return the query of (instance_id, application_id, host, port) rows for a check request.
+
+    The body names {"applications": [ids] | "all"} and/or
+    {"instances": [ids] | "all"}; a bare "all" checks everything. Returns
+    None when the body names no ids. Rows are read by target_batches, so
+    the request is validated here without loading the targets.
+    """
+    if body == 'all':
+        body = {'instances': 'all'}
+    if not isinstance(body, dict):
+        raise StatusCheckError('Request body must be a JSON object or "all"')
+    app_ids, instance_ids = _ids(body, 'applications'), _ids(body, 'instances')
+    if app_ids is None and instance_ids is None:
+        raise StatusCheckError("Provide 'applications' or 'instances'")
+
+    query = db.session.query(ApplicationInstance.id, ApplicationInstance.application_id,
+                             ApplicationInstance.host, ApplicationInstance.port)
+    if 'all' not in (app_ids, instance_ids):
+        conditions = []
+        if app_ids:
+            conditions.append(ApplicationInstance.application_id.in_(app_ids))
+        if instance_ids:
+            conditions.append(ApplicationInstance.id.in_(instance_ids))
+        if not conditions:
+            return None
+        query = query.filter(db.or_(*conditions))
+    return query
+
+
+def target_batches(query, size=None):
+    """Yield the rows of a resolve_targets() query in keyset batches, grouped by application."""
+    if query is None:
+        return
+    size = size or CHECK_BATCH_SIZE
+    last = None
+    while True:
+        batch = query
+        if last is not None:
+            last_id, last_app_id = last[0], last[1]
+            batch = batch.filter(db.or_(
+                ApplicationInstance.application_id > last_app_id,
+                db.and_(ApplicationInstance.application_id == last_app_id, ApplicationInstance.id > last_id)))
+        rows = batch.order_by(ApplicationInstance.application_id, ApplicationInstance.id).limit(size).all()
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        last = rows[-1]
+
+
+def check_targets(batches, executor=None, session=None, window=None):
+    """Probe batches of targets concurrently and yield results as they complete.
+
+    Each batch from target_batches is submitted as it is read, and the next
+    one is read once no more than `window` (CHECK_BATCH_SIZE by default)
+    probes are still in flight, so
+    any number of instances can be checked without building every future
+    up front. Yields one {"type": "instance"} dict per probe, in completion
+    order, and one {"type": "application"} rollup as soon as the last
+    instance of an application has answered. Statuses are written back
+    through a SQLStatusSink so transitions reach the change log and event
+    stream.
+    """
+    executor = executor or get_executor()
+    session = session or db.session
+    window = window or CHECK_BATCH_SIZE
+    batches = iter(batches)
+    pending = {}
+    totals, answered, down = {}, {}, {}
+    # Batches are grouped by application, so only the application of the last
+    # row read can still have instances in batches not read yet
+    open_app = None
+    exhausted = False
+
+    def rollup(app_id):
+        total, failed = totals.pop(app_id), down.pop(app_id)
+        del answered[app_id]
+        return {'type': 'application', 'id': app_id, 'status': rollup_status(total, failed)}
+
+    with SQLStatusSink(session, ApplicationInstance) as sink:
+        while True:
+            if not exhausted and len(pending) <= window:
+                previous = open_app
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted, open_app = True, None
+                else:
+                    for instance_id, app_id, host, port in batch:
+                        pending[executor.submit(host, port)] = (instance_id, app_id)
+                        totals[app_id] = totals.get(app_id, 0) + 1
+                        answered.setdefault(app_id, 0)
+                        down.setdefault(app_id, 0)
+                    open_app = batch[-1][1]
+                if previous is not None and previous != open_app and answered[previous] == totals[previous]:
+                    yield rollup(previous)
+                continue
+            if not pending:
+                break
+
+            # Wake at least every max_delay so a quiet stretch of slow probes
+            # does not hold back the statuses already buffered
+            done, _ = wait(pending, timeout=sink.max_delay, return_when=FIRST_COMPLETED)
+            sink.flush_due()
+            for future in done:
+                instance_id, app_id = pending.pop(future)
+                is_up, error = future.result()
+                status = 'up' if is_up else 'down'
+                checked_at = datetime.utcnow()
+                sink.add(instance_id, {'status': status, 'last_check': checked_at})
+                yield {'type': 'instance', 'id': instance_id, 'application_id': app_id,
+                       'status': status, 'error': error, 'checked_at': checked_at}
+
+                down[app_id] += not is_up
+                answered[app_id] += 1
+                if answered[app_id] == totals[app_id] and app_id != open_app:
+                    yield rollup(app_id)
+
+
+def save_instance_statuses(instances, results, session=None):
+    """Write back cached check results whose status differs from the stored one."""
+    with SQLStatusSink(session or db.session, ApplicationInstance) as sink:
+        for instance, result in zip(instances, results):
+            status = result['status'].lower()
+            if instance.status != status:
+                sink.add(instance.id, {'status': status, 'last_check': result['last_checked']})
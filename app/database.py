@@ -1,14 +1,178 @@
 import os
 import time
-from pymongo import MongoClient
+from threading import Lock
+from pymongo import MongoClient, ASCENDING, monitoring
 from flask import current_app
 from mongoengine import connect, disconnect
 
+DEFAULT_MONGO_URI = 'mongodb://mongo:27017/shutdown_manager'
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000))
+
+_clients = {}
+_clients_lock = Lock()
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events for a single client."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.stats = {
+            'created': 0,
+            'closed': 0,
+            'checked_out': 0,
+            'checked_in': 0,
+            'checkout_failed': 0,
+            'pools_cleared': 0
+        }
+
+    def _incr(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['open'] = stats['created'] - stats['closed']
+        stats['in_use'] = stats['checked_out'] - stats['checked_in']
+        return stats
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('checkout_failed')
+
+    def connection_checked_out(self, event):
+        self._incr('checked_out')
+
+    def connection_checked_in(self, event):
+        self._incr('checked_in')
+
+def get_client(mongo_uri=None):
+    """Get the shared MongoClient for a URI, creating it on first use.
+
+    Clients are cached for the life of the process so every request and
+    every worker sweep reuses one connection pool. They are created with
+    connect=False and dropped in forked children, which keeps them safe
+    under gunicorn's pre-fork model.
+    """
+    mongo_uri = mongo_uri or os.environ.get('MONGODB_URI', DEFAULT_MONGO_URI)
+    with _clients_lock:
+        entry = _clients.get(mongo_uri)
+        if entry is None:
+            listener = PoolStatsListener()
+            client = MongoClient(
+                mongo_uri,
+                connect=False,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                event_listeners=[listener]
+            )
+            entry = _clients[mongo_uri] = (client, listener)
+        return entry[0]
+
+def pool_stats():
+    """Return connection pool counters for every registered client."""
+    with _clients_lock:
+        entries = list(_clients.items())
+    return {
+        _redact(mongo_uri): dict(listener.snapshot(), max_pool_size=MONGO_MAX_POOL_SIZE)
+        for mongo_uri, (_, listener) in entries
+    }
+
+def _redact(mongo_uri):
+    scheme, _, rest = mongo_uri.partition('://')
+    return f"{scheme}://{rest.rsplit('@', 1)[-1]}"
+
+def close_clients():
+    """Close and forget every registered client."""
+    with _clients_lock:
+        entries = list(_clients.values())
+        _clients.clear()
+    for client, _ in entries:
+        client.close()
+
+def _reset_after_fork():
+    # The parent's sockets and monitor threads do not survive a fork, so the
+    # child starts with an empty registry instead of sharing dead clients.
+    global _clients_lock
+    _clients_lock = Lock()
+    _clients.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 def get_db():
     """Get MongoDB database instance."""
-    mongo_uri = os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/shutdown_manager')
-    client = MongoClient(mongo_uri)
-    return client.get_database()
+    return get_client().get_database()
+
+# Indexes the status worker and checker depend on, per collection
+MONGO_INDEXES = {
+    'instances': ['application_id', 'status', 'last_checked'],
+    'systems': ['host'],
+}
+
+# Representative queries that must be answered from an index
+INDEXED_QUERIES = [
+    ('instances', {'application_id': {'$in': [None]}}),
+    ('instances', {'status': 'DOWN'}),
+    ('systems', {'host': ''}),
+]
+
+def ensure_indexes(db):
+    """Create the worker's indexes; existing indexes are left untouched."""
+    created = []
+    for collection, fields in MONGO_INDEXES.items():
+        for field in fields:
+            created.append(db[collection].create_index([(field, ASCENDING)], name=f'{field}_1'))
+    return created
+
+def _uses_index(plan):
+    """Return True if an explain() plan tree contains an index scan."""
+    if isinstance(plan, dict):
+        if plan.get('stage') in ('IXSCAN', 'COUNT_SCAN', 'DISTINCT_SCAN'):
+            return True
+        return any(_uses_index(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_uses_index(value) for value in plan)
+    return False
+
+def verify_indexes(db):
+    """Explain the hot queries and return the ones that fall back to a collection scan."""
+    scans = []
+    for collection, query in INDEXED_QUERIES:
+        plan = db[collection].find(query).explain().get('queryPlanner', {}).get('winningPlan', {})
+        if not _uses_index(plan):
+            scans.append((collection, query))
+    return scans
 
 def init_db(max_retries=5, retry_delay=5):
     """Initialize database connection with retries."""
@@ -19,7 +183,7 @@ def init_db(max_retries=5, retry_delay=5):
             disconnect(alias='default')
             
             # Connect using MongoEngine with alias
-            mongo_uri = os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/shutdown_manager')
+            mongo_uri = os.environ.get('MONGODB_URI', DEFAULT_MONGO_URI)
             connect(host=mongo_uri, alias='default')
             
             db = get_db()
@@ -27,6 +191,10 @@ def init_db(max_retries=5, retry_delay=5):
             db.command('ping')
             current_app.logger.info("Successfully connected to MongoDB")
             
+            ensure_indexes(db)
+            for collection, query in verify_indexes(db):
+                current_app.logger.warning(f"Query {query} on {collection} is not using an index")
+            
             return True
         except Exception as e:
             retry_count += 1
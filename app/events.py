@@ -0,0 +1,182 @@
+import os
+import queue
+import logging
+from threading import Thread, Event, Lock
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .changes import changes_since, MAX_CHANGES_PAGE
+
+logger = logging.getLogger(__name__)
+
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', 1))
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+EVENTS_RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', 3000))
+
+
+def format_sse(data, event=None, id=None):
+    """Encode one Server-Sent Events message."""
+    lines = []
+    if id is not None:
+        lines.append(f'id: {id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+def changes_message(changes):
+    """Format a changes_since() result as a 'changes' event, or None if it is empty."""
+    if not any(changes[kind] for kind in ('instances', 'applications', 'systems', 'reset')):
+        return None
+    return format_sse(current_app.json.dumps(changes), event='changes', id=changes['version'])
+
+
+class Broadcaster:
+    """Tails the status change log once per process and fans it out to SSE clients.
+
+    A single thread reads /api/changes-style deltas every poll interval (or
+    as soon as a local commit logs a change) and puts the same pre-encoded
+    message on every subscriber's queue, so open dashboards cost one query
+    per interval in total rather than one per client. A subscriber whose
+    queue fills up is disconnected; EventSource reconnects with
+    Last-Event-ID and catches up from the change log.
+    """
+
+    def __init__(self, interval=EVENTS_POLL_INTERVAL, queue_size=EVENTS_QUEUE_SIZE):
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = Lock()
+        self._wake = Event()
+        self._thread = None
+        self.version = None
+
+    def subscribe(self, app):
+        """Register a client queue and make sure the tailing thread runs.
+
+        Must be called inside an app context. Messages are queued as
+        (version, message) pairs starting from the log version current at
+        subscription, so a client that replays its backlog afterwards can
+        drop anything it has already seen.
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.version is None:
+                self.version = changes_since(None)['version']
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, args=(app,), name='event-broadcaster', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                # Nobody listening; resynchronise from the latest version on next subscribe
+                self.version = None
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def wake(self):
+        """Poll the change log now instead of at the next interval."""
+        self._wake.set()
+
+    def publish(self, version, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((version, message))
+            except queue.Full:
+                self.unsubscribe(subscriber)
+                # Make room for the end-of-stream marker so the client reconnects
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)
+
+    def poll(self):
+        """Publish everything logged since the last poll."""
+        while self.version is not None:
+            changes = changes_since(self.version, limit=MAX_CHANGES_PAGE)
+            self.version = changes['version']
+            message = changes_message(changes)
+            if message:
+                self.publish(changes['version'], message)
+            if not changes['more']:
+                return
+
+    def _run(self, app):
+        while True:
+            if self.subscriber_count:
+                with app.app_context():
+                    try:
+                        self.poll()
+                    except Exception as e:
+                        logger.error(f"Error polling status changes: {str(e)}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+broadcaster = Broadcaster()
+
+
+def event_stream(since, session):
+    """Subscribe a client and return the generator that feeds its SSE response.
+
+    Anything logged after `since` is replayed first, so a reconnecting
+    EventSource (which sends Last-Event-ID) does not miss transitions. With
+    no `since` the client only gets changes from now on. The database
+    session is released before streaming starts so an idle client does not
+    pin a connection.
+    """
+    subscriber = broadcaster.subscribe(current_app._get_current_object())
+    backlog = []
+    try:
+        seen = since
+        while True:
+            changes = changes_since(seen, session=session)
+            seen = changes['version']
+            message = changes_message(changes) if since is not None else None
+            if message:
+                backlog.append(message)
+            if not changes['more']:
+                break
+    except Exception:
+        broadcaster.unsubscribe(subscriber)
+        raise
+    finally:
+        session.close()
+
+    def stream():
+        try:
+            yield f'retry: {EVENTS_RETRY_MS}\n\n'
+            yield from backlog
+            while True:
+                try:
+                    item = subscriber.get(timeout=EVENTS_HEARTBEAT)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if item is None:
+                    return
+                version, message = item
+                if version > seen:
+                    yield message
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return stream()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_on_commit(session):
+    # Change log rows are written on flush; push them out once they are committed
+    broadcaster.wake()
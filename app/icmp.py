@@ -0,0 +1,246 @@
+import os
+import time
+import select
+import socket
+import struct
+import logging
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Timer
+
+logger = logging.getLogger(__name__)
+
+ICMP_TIMEOUT = float(os.environ.get('ICMP_TIMEOUT', 1))
+ICMP_BATCH_WINDOW = float(os.environ.get('ICMP_BATCH_WINDOW', 0.02))
+ICMP_RESOLVE_WORKERS = int(os.environ.get('ICMP_RESOLVE_WORKERS', 32))
+ICMP_RECV_BUFFER = int(os.environ.get('ICMP_RECV_BUFFER', 1 << 20))
+
+ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+PROTOCOL = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+MAX_SEQUENCE = 0xFFFF
+
+_identifiers = itertools.count((os.getpid() * 7919) & 0xFFFF)
+
+
+class IcmpUnavailable(OSError):
+    """Raised when neither raw nor unprivileged ICMP sockets can be opened."""
+
+
+def checksum(data):
+    """RFC 1071 internet checksum."""
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request(family, identifier, sequence, payload):
+    header = struct.pack('!BBHHH', ECHO_REQUEST[family], 0, 0, identifier, sequence)
+    # The kernel fills in the ICMPv6 checksum, which covers the IPv6 pseudo-header
+    value = checksum(header + payload) if family == socket.AF_INET else 0
+    return struct.pack('!BBHHH', ECHO_REQUEST[family], 0, value, identifier, sequence) + payload
+
+
+def open_socket(family):
+    """Return (socket, is_raw), preferring a raw socket and falling back to an ICMP datagram socket."""
+    for kind in (socket.SOCK_RAW, socket.SOCK_DGRAM):
+        try:
+            sock = socket.socket(family, kind, PROTOCOL[family])
+        except PermissionError:
+            continue
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, ICMP_RECV_BUFFER)
+        except OSError:
+            pass
+        return sock, kind == socket.SOCK_RAW
+    raise IcmpUnavailable(f'No permission to open an ICMP socket (family {family})')
+
+
+def _resolve(host):
+    try:
+        family, _, _, _, address = socket.getaddrinfo(host, None, 0, socket.SOCK_DGRAM)[0]
+    except (socket.gaierror, UnicodeError, IndexError):
+        return None
+    if family not in ECHO_REQUEST:
+        return None
+    return family, address[0]
+
+
+class IcmpSweeper:
+    """Pings many hosts at once from one ICMP socket per address family.
+
+    Every echo request of a sweep carries the sweep's identifier, a
+    sequence number of its own and a random token. Replies are matched
+    back on sequence, source address and token, plus the identifier on raw
+    sockets. On ICMP datagram sockets the kernel replaces the identifier
+    with the socket's own, and only delivers that socket's replies. All
+    requests go out before the sweep waits, so a whole batch is answered
+    within a single timeout window, without forking a ping process per
+    host.
+    """
+
+    def __init__(self, timeout=ICMP_TIMEOUT, resolve_workers=ICMP_RESOLVE_WORKERS):
+        self.timeout = timeout
+        self.resolve_workers = resolve_workers
+
+    def sweep(self, hosts):
+        """Return {host: round trip seconds or None} for every host."""
+        hosts = list(dict.fromkeys(host for host in hosts if host))
+        results = dict.fromkeys(hosts)
+        if not hosts:
+            return results
+        if len(hosts) == 1:
+            resolved = [_resolve(hosts[0])]
+        else:
+            with ThreadPoolExecutor(min(len(hosts), self.resolve_workers)) as pool:
+                resolved = list(pool.map(_resolve, hosts))
+        targets = [(host, address) for host, address in zip(hosts, resolved) if address]
+        for start in range(0, len(targets), MAX_SEQUENCE):
+            results.update(self._sweep(targets[start:start + MAX_SEQUENCE]))
+        return results
+
+    def _sweep(self, targets):
+        sockets = {}
+        try:
+            for family in {family for _, (family, _) in targets}:
+                sockets[family] = open_socket(family)
+            return self._exchange(targets, sockets)
+        finally:
+            for sock, _ in sockets.values():
+                sock.close()
+
+    def _exchange(self, targets, sockets):
+        identifier = next(_identifiers) & 0xFFFF
+        token = os.urandom(8)
+        pending = {}
+        results = {}
+        by_socket = {sock: (family, raw) for family, (sock, raw) in sockets.items()}
+
+        def receive():
+            readable, _, _ = select.select(list(by_socket), [], [], 0)
+            for sock in readable:
+                family, raw = by_socket[sock]
+                while True:
+                    try:
+                        data, source = sock.recvfrom(2048)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    received = time.monotonic()
+                    if raw and family == socket.AF_INET:
+                        data = data[(data[0] & 0x0F) * 4:]
+                    if len(data) < 16 or data[8:16] != token:
+                        continue
+                    kind, _, _, reply_identifier, sequence = struct.unpack('!BBHHH', data[:8])
+                    if kind != ECHO_REPLY[family] or (raw and reply_identifier != identifier):
+                        continue
+                    target = pending.get(sequence)
+                    if target and source[0].split('%')[0] == target[1]:
+                        del pending[sequence]
+                        results[target[0]] = received - target[2]
+
+        last_sent = time.monotonic()
+        for sequence, (host, (family, address)) in enumerate(targets, start=1):
+            sock, _ = sockets[family]
+            packet = echo_request(family, identifier, sequence, token)
+            while True:
+                try:
+                    sock.sendto(packet, (address, 0))
+                except (BlockingIOError, InterruptedError):
+                    # Send buffer full: collect replies while it drains
+                    _, writable, _ = select.select([], [sock], [], self.timeout)
+                    receive()
+                    if writable:
+                        continue
+                    logger.debug(f"ICMP socket stayed full, not pinging {host}")
+                    break
+                except OSError as e:
+                    logger.debug(f"ICMP echo to {host} ({address}) failed: {e}")
+                    break
+                last_sent = time.monotonic()
+                pending[sequence] = (host, address, last_sent)
+                break
+            if not sequence % 256:
+                receive()
+
+        deadline = last_sent + self.timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            select.select(list(by_socket), [], [], remaining)
+            receive()
+        # Replies that arrive after their own timeout window do not count
+        return {host: rtt for host, rtt in results.items() if rtt <= self.timeout}
+
+
+class PingBatcher:
+    """Coalesces single-host pings from many threads into sweeps.
+
+    The first ping() in a quiet period opens a batch window. Every host
+    asked for during it, from any thread, goes out in one IcmpSweeper
+    sweep. Callers such as the probe cache's thread pool keep their
+    one-host API while the network sees one batch.
+    """
+
+    def __init__(self, sweeper=None, window=ICMP_BATCH_WINDOW):
+        self.sweeper = sweeper or IcmpSweeper()
+        self.window = window
+        self.sweeps = 0
+        self._pending = {}
+        self._scheduled = False
+        self._lock = Lock()
+
+    def ping(self, host):
+        """Return the round trip in seconds, or None if host did not answer."""
+        with self._lock:
+            future = self._pending.get(host)
+            if future is None:
+                future = self._pending[host] = Future()
+                if not self._scheduled:
+                    self._scheduled = True
+                    timer = Timer(self.window, self._flush)
+                    timer.daemon = True
+                    timer.start()
+        return future.result()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+            self.sweeps += 1
+        try:
+            results = self.sweeper.sweep(list(pending))
+        except Exception as e:
+            for future in pending.values():
+                future.set_exception(e)
+            return
+        for host, future in pending.items():
+            future.set_result(results.get(host))
+
+
+_pinger = None
+_pinger_lock = Lock()
+
+
+def get_pinger():
+    """Return the process-wide PingBatcher, creating it on first use."""
+    global _pinger
+    with _pinger_lock:
+        if _pinger is None:
+            _pinger = PingBatcher()
+        return _pinger
+
+
+def _reset_after_fork():
+    # A pending batch's timer thread does not survive a fork
+    global _pinger, _pinger_lock
+    _pinger = None
+    _pinger_lock = Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from threading import Lock
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from .models import db, ApplicationInstance
+from .planner import plan_cache
+from .versioning import bump_version, current_version
+
+HOSTS = 'hosts'
+
+
+def host_key(value):
+    """Normalise a host or db_host value ('db1.example.com:5432') to the bare host name."""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value.startswith('['):
+        return value[1:value.find(']')] if ']' in value else value[1:]
+    return value.rsplit(':', 1)[0] if value.count(':') == 1 else value
+
+
+class HostIndex:
+    """Which applications run on, or keep their database on, each host.
+
+    Rebuilt from one column query whenever the 'hosts' data version moves.
+    Instance status updates do not move it, so the index survives probe
+    sweeps and only follows inventory changes.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._applications = {}
+        self._lock = Lock()
+
+    def clear(self):
+        with self._lock:
+            self.version = None
+            self._applications = {}
+
+    def applications(self, host, session=None):
+        """Ids of the applications with an instance or database on host."""
+        session = session or db.session
+        with self._lock:
+            version = current_version(HOSTS, session)
+            if version != self.version:
+                index = defaultdict(set)
+                for app_id, instance_host, db_host in session.execute(
+                        select(ApplicationInstance.application_id, ApplicationInstance.host,
+                               ApplicationInstance.db_host)):
+                    index[host_key(instance_host)].add(app_id)
+                    if db_host:
+                        index[host_key(db_host)].add(app_id)
+                index.pop(None, None)
+                self._applications, self.version = dict(index), version
+            return set(self._applications.get(host_key(host), ()))
+
+
+host_index = HostIndex()
+
+
+def impact(host=None, app_id=None, session=None):
+    """Return (sources, impacted) id sets for a host or an application.
+
+    Sources are the applications on the host (or the application itself)
+    and impacted is everything else that depends on them, directly or
+    through other applications, following the shutdown dependencies. Both
+    come from process caches, so a lookup costs two version checks.
+    """
+    sources = host_index.applications(host, session) if host is not None else {app_id}
+    return plan_cache.impact(sources, session)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_host_changes(session, flush_context):
+    for obj in session.new | session.deleted:
+        if isinstance(obj, ApplicationInstance):
+            bump_version(HOSTS, session)
+            return
+    for obj in session.dirty:
+        if isinstance(obj, ApplicationInstance) and any(
+                get_history(obj, attr).has_changes() for attr in ('host', 'db_host', 'application_id')):
+            bump_version(HOSTS, session)
+            return
@@ -0,0 +1,551 @@
+import io
+import os
+import csv
+import time
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy import func
+from .models import db, Team, Application, ApplicationInstance, ApplicationDependency, application_systems
+from .utils import clean_csv_value, map_csv_columns
+from .versioning import bump_version
+from .rollups import refresh_rollups
+from .planner import PLAN
+from .impact import HOSTS
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+MAX_REPORTED_ERRORS = int(os.environ.get('IMPORT_MAX_REPORTED_ERRORS', 1000))
+REQUIRED_COLUMNS = ['name', 'team', 'host']
+IMPORT_MODES = ('replace', 'sync')
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', os.cpu_count() or 1))
+IMPORT_CHUNK_BYTES = int(os.environ.get('IMPORT_CHUNK_BYTES', 4 * 1024 * 1024))
+# Parsed ranges waiting to be written, per worker; bounds memory when the writer is slower
+IMPORT_INFLIGHT_PER_WORKER = int(os.environ.get('IMPORT_INFLIGHT_PER_WORKER', 2))
+# Forking a process that holds database connections and threads is unsafe
+IMPORT_START_METHOD = os.environ.get('IMPORT_START_METHOD', 'forkserver'
+                                     if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+class CSVImportError(Exception):
+    """Raised when an upload cannot be imported at all."""
+
+
+class ImportStats:
+    """Counters describing a finished (or running) import."""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.skipped = 0
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add_error(self, error):
+        # Keep the report bounded for files that are wrong on every row
+        self.skipped += 1
+        self.warn(error)
+
+    def warn(self, message):
+        """Report a problem that did not cause a row to be skipped."""
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else 0
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'deleted': self.deleted,
+            'unchanged': self.unchanged,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+            'errors': self.errors if self.errors else None
+        }
+
+
+def open_text_stream(stream, encoding='utf-8'):
+    """Wrap a binary upload stream so it is decoded incrementally.
+
+    Werkzeug spools large uploads to a temporary file, so reading through
+    the wrapper keeps only one buffer of text in memory at a time.
+    """
+    if not hasattr(stream, 'readable'):
+        # SpooledTemporaryFile only implements the io interface from Python 3.11
+        stream = getattr(stream, '_file', stream)
+    return io.TextIOWrapper(stream, encoding=encoding, newline='')
+
+
+def resolve_columns(reader):
+    """Normalise a DictReader's headers and map them onto import columns.
+
+    Returns the canonical column -> header mapping and raises CSVImportError
+    when the file has no headers or lacks a required column.
+    """
+    if not reader.fieldnames:
+        raise CSVImportError('CSV file has no headers')
+    reader.fieldnames = [header.strip().lower() for header in reader.fieldnames]
+    columns = map_csv_columns(reader.fieldnames)
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise CSVImportError(f'Missing required columns: {", ".join(missing)}')
+    return columns
+
+
+def validate_row(row, columns):
+    """Validate a CSV row, returning (record, reason)."""
+    record = {column: clean_csv_value(row.get(header)) for column, header in columns.items()}
+    missing = [column for column in REQUIRED_COLUMNS if not record.get(column)]
+    if missing:
+        return None, f"Missing values for {', '.join(missing)}"
+
+    port = record.get('port')
+    if port is not None:
+        if not port.isdigit():
+            return None, f"Invalid value - port '{port}' is not a number"
+        record['port'] = int(port)
+
+    order = record.get('shutdown_order')
+    if order is not None:
+        try:
+            record['shutdown_order'] = int(order)
+        except ValueError:
+            return None, f"Invalid value - shutdown_order '{order}' is not a number"
+    if 'dependencies' in record:
+        record['dependencies'] = [name.strip() for name in (record['dependencies'] or '').split(';')
+                                  if name.strip()]
+    return record, None
+
+
+def parse_row(row_num, row, columns):
+    """Validate a CSV row, returning (record, error)."""
+    record, reason = validate_row(row, columns)
+    return record, reason and f"Row {row_num}: {reason}"
+
+
+def split_byte_ranges(path, parts, start=0):
+    """Split a file into about `parts` byte ranges that end on line boundaries."""
+    size = os.path.getsize(path)
+    step = max((size - start) // max(parts, 1), 1)
+    ranges = []
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + step, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_byte_range(path, start, end, fieldnames, columns, encoding='utf-8'):
+    """Parse and validate the rows in one byte range of a CSV file.
+
+    Runs in a worker process. Row positions are relative to the range so
+    the caller can turn them into file row numbers once the preceding
+    ranges have been counted. Returns (row_count, records, errors).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+
+    records = []
+    errors = []
+    count = 0
+    for values in csv.reader(io.StringIO(text, newline='')):
+        if not values:
+            continue
+        record, reason = validate_row(dict(zip(fieldnames, values)), columns)
+        if reason:
+            errors.append((count, reason))
+        else:
+            records.append((count, record))
+        count += 1
+    return count, records, errors
+
+
+class BulkWriter:
+    """Inserts validated records in batches inside the caller's transaction.
+
+    Teams and applications are resolved through in-memory name -> id maps
+    that are loaded once, so each batch costs a handful of executemany
+    statements regardless of how many rows it holds. Rows that share an
+    application name become instances of the same application.
+    """
+
+    def __init__(self, session=None, batch_size=IMPORT_BATCH_SIZE):
+        self.session = session or db.session
+        self.batch_size = batch_size
+        self.team_ids = dict(self.session.query(Team.name, Team.id))
+        self.app_ids = dict(
+            self.session.query(Application.name, func.max(Application.id)).group_by(Application.name))
+        self.orders = {}
+        self.dependencies = {}
+        self._pending = []
+
+    def note_ordering(self, record):
+        """Remember a row's shutdown_order and dependencies for write_ordering."""
+        if record.get('shutdown_order') is not None:
+            self.orders[record['name']] = record['shutdown_order']
+        if 'dependencies' in record:
+            self.dependencies.setdefault(record['name'], set()).update(record['dependencies'])
+
+    def add(self, record):
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        now = datetime.utcnow()
+
+        self.ensure_teams({r['team'] for r in pending})
+
+        new_apps = {}
+        for r in pending:
+            if r['name'] not in self.app_ids and r['name'] not in new_apps:
+                new_apps[r['name']] = {
+                    'name': r['name'],
+                    'team_id': self.team_ids[r['team']],
+                    'webui_url': r.get('webui_url'),
+                    'shutdown_order': self.orders.get(r['name']),
+                    'created_at': now,
+                    'updated_at': now
+                }
+        if new_apps:
+            self._insert(Application, list(new_apps.values()))
+            self.app_ids.update(self._lookup(Application, new_apps))
+
+        self._insert(ApplicationInstance, [{
+            'application_id': self.app_ids[r['name']],
+            'host': r['host'],
+            'port': r.get('port'),
+            'webui_url': r.get('webui_url'),
+            'db_host': r.get('db_host'),
+            'status': 'unknown',  # Default to unknown, will be updated by monitoring
+            'created_at': now,
+            'updated_at': now
+        } for r in pending])
+        return len(pending)
+
+    def write_ordering(self, stats):
+        """Apply noted shutdown_order values and replace the dependency edges of noted applications.
+
+        Dependencies are resolved by name once every row has been written,
+        so a row may name an application that appears later in the file.
+        """
+        self.flush()
+        orders = [{'id': self.app_ids[name], 'shutdown_order': order}
+                  for name, order in self.orders.items() if name in self.app_ids]
+        if orders:
+            self.session.bulk_update_mappings(Application, orders)
+
+        owners = [self.app_ids[name] for name in self.dependencies if name in self.app_ids]
+        for i in range(0, len(owners), 500):
+            self.session.query(ApplicationDependency).filter(
+                ApplicationDependency.application_id.in_(owners[i:i + 500])).delete(synchronize_session=False)
+        edges = []
+        for name, dependencies in self.dependencies.items():
+            for dependency in sorted(dependencies):
+                if dependency not in self.app_ids:
+                    stats.warn(f"Unknown dependency '{dependency}' of {name}")
+                elif dependency != name:
+                    edges.append({'application_id': self.app_ids[name],
+                                  'dependency_id': self.app_ids[dependency],
+                                  'dependency_type': 'shutdown_before'})
+        if edges:
+            self._insert(ApplicationDependency, edges)
+
+    def ensure_teams(self, names):
+        """Create any of the named teams that do not exist yet."""
+        new_teams = set(names) - self.team_ids.keys()
+        if new_teams:
+            now = datetime.utcnow()
+            self._insert(Team, [{'name': name, 'created_at': now, 'updated_at': now}
+                                for name in sorted(new_teams)])
+            self.team_ids.update(self._lookup(Team, new_teams))
+
+    def _insert(self, model, rows):
+        self.session.execute(model.__table__.insert(), rows)
+
+    def _lookup(self, model, names):
+        names = list(names)
+        ids = {}
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(names), 500):
+            ids.update(self.session.query(model.name, func.max(model.id))
+                       .filter(model.name.in_(names[i:i + 500]))
+                       .group_by(model.name))
+        return ids
+
+
+class InventoryDiff:
+    """Applies an import as a diff against the current instances.
+
+    Instances are keyed on (application name, host, port). Matching rows
+    are updated only when a tracked field changed, new keys are handed to
+    the BulkWriter, and instances missing from the file are deleted along
+    with applications left without any instance. Untouched rows keep their
+    status and check history.
+    """
+
+    def __init__(self, writer, session=None, batch_size=IMPORT_BATCH_SIZE):
+        self.writer = writer
+        self.session = session or db.session
+        self.batch_size = batch_size
+        self.existing = {}
+        self.app_teams = {}
+        for row in (self.session.query(
+                ApplicationInstance.id, ApplicationInstance.host, ApplicationInstance.port,
+                ApplicationInstance.webui_url, ApplicationInstance.db_host,
+                Application.id, Application.name, Application.team_id)
+                .join(Application, ApplicationInstance.application_id == Application.id)):
+            instance_id, host, port, webui_url, db_host, app_id, name, team_id = row
+            self.existing[(name, host, port)] = (instance_id, app_id, webui_url, db_host)
+            self.app_teams[app_id] = team_id
+        self.seen = set()
+        self.inserted_names = set()
+        self.team_changes = {}
+        self._updates = []
+
+    def add(self, record, stats):
+        """Classify a validated record; returns False for a duplicate key."""
+        key = (record['name'], record['host'], record.get('port'))
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+
+        current = self.existing.get(key)
+        if current is None:
+            self.writer.add(record)
+            self.inserted_names.add(record['name'])
+            stats.inserted += 1
+            return True
+
+        instance_id, app_id, webui_url, db_host = current
+        self.team_changes[app_id] = record['team']
+        if (webui_url, db_host) == (record.get('webui_url'), record.get('db_host')):
+            stats.unchanged += 1
+            return True
+
+        self._updates.append({
+            'id': instance_id,
+            'webui_url': record.get('webui_url'),
+            'db_host': record.get('db_host'),
+            'updated_at': datetime.utcnow()
+        })
+        stats.updated += 1
+        if len(self._updates) >= self.batch_size:
+            self._flush_updates()
+        return True
+
+    def _flush_updates(self):
+        updates, self._updates = self._updates, []
+        if updates:
+            self.session.bulk_update_mappings(ApplicationInstance, updates)
+
+    def finish(self, stats):
+        """Apply pending updates, team moves and deletions."""
+        self.writer.flush()
+        self._flush_updates()
+
+        self.writer.ensure_teams(set(self.team_changes.values()))
+        moves = [{'id': app_id, 'team_id': self.writer.team_ids[team]}
+                 for app_id, team in self.team_changes.items()
+                 if self.app_teams.get(app_id) != self.writer.team_ids[team]]
+        if moves:
+            self.session.bulk_update_mappings(Application, moves)
+
+        removed = [(instance_id, app_id) for key, (instance_id, app_id, _, _) in self.existing.items()
+                   if key not in self.seen]
+        kept_apps = set(self.team_changes) | {self.writer.app_ids[name] for name in self.inserted_names}
+        orphaned = list({app_id for _, app_id in removed} - kept_apps)
+        removed = [instance_id for instance_id, _ in removed]
+        # Orphans must not be picked up as dependency targets afterwards
+        orphan_ids = set(orphaned)
+        self.writer.app_ids = {name: app_id for name, app_id in self.writer.app_ids.items()
+                               if app_id not in orphan_ids}
+        for i in range(0, len(removed), 500):
+            self.session.query(ApplicationInstance).filter(
+                ApplicationInstance.id.in_(removed[i:i + 500])).delete(synchronize_session=False)
+        for i in range(0, len(orphaned), 500):
+            chunk = orphaned[i:i + 500]
+            self.session.query(ApplicationDependency).filter(db.or_(
+                ApplicationDependency.application_id.in_(chunk),
+                ApplicationDependency.dependency_id.in_(chunk))).delete(synchronize_session=False)
+            self.session.execute(application_systems.delete().where(application_systems.c.application_id.in_(chunk)))
+            self.session.query(Application).filter(
+                Application.id.in_(chunk)).delete(synchronize_session=False)
+        stats.deleted = len(removed)
+
+
+def clear_inventory(session=None):
+    """Delete every instance, dependency, system link, application and team.
+
+    Systems themselves are not part of the CSV and are kept.
+    """
+    session = session or db.session
+    session.execute(application_systems.delete())
+    session.query(ApplicationInstance).delete(synchronize_session=False)
+    session.query(ApplicationDependency).delete(synchronize_session=False)
+    session.query(Application).delete(synchronize_session=False)
+    session.query(Team).delete(synchronize_session=False)
+
+
+def import_csv(reader, mode='replace', session=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Import application rows from a csv.DictReader in one transaction.
+
+    Rows are pulled from the reader lazily and written in batch_size chunks,
+    so memory stays flat however large the file is.
+
+    In 'replace' mode the existing inventory is deleted first, inside the
+    same transaction, so readers never observe an empty dashboard. In
+    'sync' mode only the differences are applied (see InventoryDiff).
+    Nothing is committed unless at least one row imports.
+
+    progress, if given, is called with the running ImportStats after every
+    batch; raising from it aborts the import and rolls everything back.
+    """
+    columns = resolve_columns(reader)
+    rows = (parse_row(row_num, row, columns) for row_num, row in enumerate(reader, start=2))
+    return _run_import(rows, mode, session, batch_size, progress)
+
+
+def import_csv_parallel(path, mode='replace', session=None, batch_size=IMPORT_BATCH_SIZE,
+                        workers=None, chunk_bytes=None, progress=None):
+    """Import a CSV file, parsing and validating it in a process pool.
+
+    The file is cut into byte ranges on line boundaries, each range is
+    parsed by a worker process and the validated records are fed, in file
+    order, to the same single writer import_csv uses. Only a bounded
+    window of ranges is parsed ahead of the writer. Records must not
+    contain quoted line breaks, since ranges are split on raw newlines.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = resolve_columns(reader)
+        fieldnames = reader.fieldnames
+    with open(path, 'rb') as f:
+        header_end = len(f.readline())
+
+    workers = workers or IMPORT_WORKERS
+    parts = max(workers, os.path.getsize(path) // (chunk_bytes or IMPORT_CHUNK_BYTES))
+    ranges = split_byte_ranges(path, parts, start=header_end)
+
+    def parsed(pool):
+        # Keep a bounded window of ranges in flight and hand them over in file order
+        pending = deque()
+        ranges_left = iter(ranges)
+        for start, end in ranges_left:
+            pending.append(pool.submit(parse_byte_range, path, start, end, fieldnames, columns))
+            if len(pending) >= workers * IMPORT_INFLIGHT_PER_WORKER:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for start, end in ranges_left:
+                pending.append(pool.submit(parse_byte_range, path, start, end, fieldnames, columns))
+                break
+            yield result
+
+    def rows(pool):
+        row_base = 2
+        for count, records, errors in parsed(pool):
+            errors = iter(errors)
+            error = next(errors, None)
+            for index, record in records:
+                while error and error[0] < index:
+                    yield None, f"Row {row_base + error[0]}: {error[1]}"
+                    error = next(errors, None)
+                yield record, None
+            while error:
+                yield None, f"Row {row_base + error[0]}: {error[1]}"
+                error = next(errors, None)
+            row_base += count
+
+    context = multiprocessing.get_context(IMPORT_START_METHOD)
+    if IMPORT_START_METHOD == 'forkserver':
+        context.set_forkserver_preload([__name__])
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        stats = _run_import(rows(pool) if ranges else iter(()), mode, session, batch_size, progress)
+    except BaseException:
+        # A failed or cancelled import must not wait for ranges nobody will read
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return stats
+
+
+def _run_import(rows, mode, session, batch_size, progress=None):
+    """Feed (record, error) pairs to the writer inside one transaction."""
+    if mode not in IMPORT_MODES:
+        raise CSVImportError(f'Unknown import mode: {mode}')
+    session = session or db.session
+    stats = ImportStats()
+
+    try:
+        if mode == 'replace':
+            clear_inventory(session)
+        writer = BulkWriter(session, batch_size=batch_size)
+        diff = InventoryDiff(writer, session, batch_size=batch_size) if mode == 'sync' else None
+
+        for record, error in rows:
+            stats.rows += 1
+            if progress and not stats.rows % batch_size:
+                stats.elapsed = time.monotonic() - stats.started
+                progress(stats)
+            if error:
+                stats.add_error(error)
+                continue
+            writer.note_ordering(record)
+            if diff is None:
+                writer.add(record)
+                stats.inserted += 1
+            elif not diff.add(record, stats):
+                stats.add_error(f"Row {stats.rows + 1}: Duplicate instance {record['name']} "
+                                f"on {record['host']}:{record.get('port') or ''}")
+                continue
+            stats.imported += 1
+
+        if diff is None:
+            writer.flush()
+        elif stats.imported:
+            diff.finish(stats)
+
+        if stats.imported:
+            writer.write_ordering(stats)
+            # Core writes skip the flush hooks, so recount the rollups in one pass
+            refresh_rollups(session=session)
+            bump_version(session=session)
+            bump_version(PLAN, session=session)
+            bump_version(HOSTS, session=session)
+            session.commit()
+        else:
+            session.rollback()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        stats.elapsed = time.monotonic() - stats.started
+
+    logger.info(f"Imported {stats.imported} rows ({stats.skipped} skipped, "
+                f"{stats.inserted} inserted, {stats.updated} updated, {stats.deleted} deleted) "
+                f"in {stats.elapsed:.3f}s, {stats.rows_per_second} rows/s")
+    return stats
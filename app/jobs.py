@@ -0,0 +1,128 @@
+import os
+import uuid
+import logging
+from datetime import datetime
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_HISTORY = int(os.environ.get('JOB_HISTORY', 100))
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+class Job:
+    """A unit of background work with progress counters and cancellation."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.state = 'queued'
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = Event()
+
+    @property
+    def done(self):
+        return self.state in ('completed', 'failed', 'cancelled')
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def update(self, **progress):
+        """Record progress and stop the job if it has been cancelled."""
+        self.progress.update(progress)
+        if self.cancelled:
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobManager:
+    """Runs jobs on a small thread pool and keeps their state for polling.
+
+    Job state lives in the process that accepted the job, so behind a
+    multi-worker server the status endpoints must be routed to the same
+    worker (or the server run with a single worker process).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = Lock()
+
+    def submit(self, kind, fn, *args, cleanup=None, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return the Job tracking it.
+
+        cleanup() runs once the job is over, whether it completed, failed or
+        was cancelled before it started.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs, cleanup)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job, fn, args, kwargs, cleanup):
+        try:
+            if job.cancelled:
+                job.state = 'cancelled'
+                return
+            job.state = 'running'
+            job.started_at = datetime.utcnow()
+            job.result = fn(job, *args, **kwargs)
+            job.state = 'completed'
+        except JobCancelled:
+            job.state = 'cancelled'
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.kind}) failed")
+            job.error = str(e)
+            job.state = 'failed'
+        finally:
+            job.finished_at = datetime.utcnow()
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception:
+                    logger.exception(f"Cleanup of job {job.id} ({job.kind}) failed")
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job.id]
+
+
+jobs = JobManager()
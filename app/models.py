@@ -1,8 +1,6 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 from flask import current_app
-
-db = SQLAlchemy()
+from . import db
 
 # Association table for many-to-many relationship between applications and systems
 application_systems = db.Table('application_systems',
@@ -14,7 +12,7 @@ class Team(db.Model):
     __tablename__ = 'teams'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -32,16 +30,24 @@ class Application(db.Model):
     __tablename__ = 'applications'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False, index=True)
     description = db.Column(db.String(500))
     webui_url = db.Column(db.String(200))
     state = db.Column(db.String(50), default='notStarted')
+    shutdown_order = db.Column(db.Integer)  # higher stops first among independent applications
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     systems = db.relationship('System', secondary=application_systems, lazy='joined',
         backref=db.backref('applications', lazy=True))
+    instances = db.relationship('ApplicationInstance', backref='application', lazy=True,
+        cascade='all, delete-orphan')
+    dependencies = db.relationship('ApplicationDependency', lazy=True, cascade='all, delete-orphan',
+        foreign_keys='ApplicationDependency.application_id', back_populates='owner')
+    dependents = db.relationship('ApplicationDependency', lazy=True, cascade='all, delete-orphan',
+        foreign_keys='ApplicationDependency.dependency_id', back_populates='application')
+    team = db.synonym('team_ref')
     
     def to_dict(self):
         return {
@@ -52,6 +58,7 @@ class Application(db.Model):
             'description': self.description,
             'webui_url': self.webui_url,
             'state': self.state,
+            'shutdown_order': self.shutdown_order,
             'systems': [system.to_dict() for system in self.systems],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -81,14 +88,18 @@ class System(db.Model):
 
 class ApplicationInstance(db.Model):
     __tablename__ = 'application_instances'
+    # (application_id, status) also serves lookups on application_id alone
+    __table_args__ = (
+        db.Index('ix_application_instances_application_id_status', 'application_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     application_id = db.Column(db.Integer, db.ForeignKey('applications.id'), nullable=False)
-    host = db.Column(db.String(100), nullable=False)
+    host = db.Column(db.String(100), nullable=False, index=True)
     port = db.Column(db.Integer)
     webui_url = db.Column(db.String(200))
     db_host = db.Column(db.String(100))
-    status = db.Column(db.String(20), default='unknown')
+    status = db.Column(db.String(20), default='unknown', index=True)
     last_check = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -109,6 +120,79 @@ class ApplicationInstance(db.Model):
             'sequence': self.sequence
         }
 
+class ApplicationDependency(db.Model):
+    """Shutdown ordering edge from the CSV 'dependencies' column.
+
+    The row of `owner` lists `application`, which has to be shut down
+    before `owner` when the type is 'shutdown_before' (a Frontend listed on
+    its Backend's row stops before the Backend).
+    """
+    __tablename__ = 'application_dependencies'
+    __table_args__ = (
+        db.UniqueConstraint('application_id', 'dependency_id', name='uq_application_dependencies_pair'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    application_id = db.Column(db.Integer, db.ForeignKey('applications.id'), nullable=False, index=True)
+    dependency_id = db.Column(db.Integer, db.ForeignKey('applications.id'), nullable=False, index=True)
+    dependency_type = db.Column(db.String(20), nullable=False, default='shutdown_before')
+    
+    owner = db.relationship('Application', foreign_keys=[application_id], back_populates='dependencies')
+    application = db.relationship('Application', foreign_keys=[dependency_id], back_populates='dependents')
+
+class DataVersion(db.Model):
+    """Monotonic counters bumped whenever the data they name changes."""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class StatusChange(db.Model):
+    """Append-only log of instance and system status and application state transitions."""
+    __tablename__ = 'status_changes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'instance', 'application' or 'system'
+    entity_id = db.Column(db.Integer, nullable=False)
+    application_id = db.Column(db.Integer)
+    field = db.Column(db.String(20), nullable=False)
+    old_value = db.Column(db.String(50))
+    new_value = db.Column(db.String(50))
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'application_id': self.application_id,
+            'field': self.field,
+            'old_value': self.old_value,
+            'new_value': self.new_value,
+            'changed_at': self.changed_at.isoformat() if self.changed_at else None
+        }
+
+class ApplicationStatusRollup(db.Model):
+    """Instance status counts per application, kept current by app.rollups."""
+    __tablename__ = 'application_status_rollups'
+    
+    # No foreign keys: rows are refreshed after the flush that deletes their application
+    application_id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, index=True)
+    up = db.Column(db.Integer, nullable=False, default=0)
+    down = db.Column(db.Integer, nullable=False, default=0)
+    unknown = db.Column(db.Integer, nullable=False, default=0)
+
+class TeamStatusRollup(db.Model):
+    """Application and instance status counts per team, kept current by app.rollups."""
+    __tablename__ = 'team_status_rollups'
+    
+    team_id = db.Column(db.Integer, primary_key=True)
+    applications = db.Column(db.Integer, nullable=False, default=0)
+    up = db.Column(db.Integer, nullable=False, default=0)
+    down = db.Column(db.Integer, nullable=False, default=0)
+    unknown = db.Column(db.Integer, nullable=False, default=0)
+
 def init_db():
     # Create tables
     db.create_all()
@@ -0,0 +1,425 @@
+from collections import defaultdict
+from threading import Lock
+from sqlalchemy import event, select, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from .models import db, Application, ApplicationDependency
+from .versioning import bump_version, current_version
+
+PLAN = 'plan'
+
+
+class ShutdownPlan:
+    """Result of ordering a set of applications for shutdown.
+
+    `waves` are lists of application ids that can stop in parallel; every
+    application stops after everything it waits for in an earlier wave.
+    Within a wave, and in the flat `order`, higher shutdown_order values
+    come first. Applications caught in dependency cycles, or waiting on
+    one, cannot be placed; they are listed in `blocked` and the cycles
+    themselves in `cycles`.
+    """
+
+    def __init__(self, waves, cycles, critical_path, blocked=()):
+        self.waves = waves
+        self.cycles = cycles
+        self.critical_path = critical_path
+        self.blocked = list(blocked)
+
+    @property
+    def order(self):
+        return [app_id for wave in self.waves for app_id in wave]
+
+    def to_dict(self, names=None):
+        label = (lambda app_id: {'id': app_id, 'name': names.get(app_id)}) if names else (lambda app_id: app_id)
+        return {
+            'applications': sum(len(wave) for wave in self.waves),
+            'waves': [[label(app_id) for app_id in wave] for wave in self.waves],
+            'cycles': [[label(app_id) for app_id in cycle] for cycle in self.cycles],
+            'blocked': [label(app_id) for app_id in self.blocked],
+            'critical_path': [label(app_id) for app_id in self.critical_path],
+        }
+
+
+class DependencyGraph:
+    """Applications, their shutdown edges and the wave each one stops in.
+
+    An application's level is 0 when nothing has to stop before it and one
+    past its latest predecessor otherwise, which is the wave a Kahn sort by
+    levels puts it in. Applications in or behind a cycle get no level and
+    are kept in `blocked`. relevel() only revisits the applications
+    downstream of a change, and a wave is only re-sorted when its members
+    change. The upstream closures that upstream() memoizes depend on the
+    same applications, so they are dropped alongside.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.successors = defaultdict(set)
+        self.predecessors = defaultdict(set)
+        self.levels = {}
+        self.parent = {}
+        self.blocked = set()
+        self._members = defaultdict(set)
+        self._sorted = {}
+        self._closures = {}
+
+    def rank(self, app_id):
+        order = self.nodes[app_id]
+        return (-order if order is not None else float('inf'), app_id)
+
+    def add_node(self, app_id, shutdown_order):
+        self.nodes[app_id] = shutdown_order
+
+    def add_edge(self, before, after):
+        if before in self.nodes and after in self.nodes and before != after:
+            self.successors[before].add(after)
+            self.predecessors[after].add(before)
+
+    def remove_node(self, app_id):
+        """Drop an application and its edges; returns the applications that waited on it."""
+        released = self.successors.pop(app_id, set())
+        for successor in released:
+            self.predecessors[successor].discard(app_id)
+        for predecessor in self.predecessors.pop(app_id, ()):
+            self.successors[predecessor].discard(app_id)
+        self._unplace(app_id)
+        self.nodes.pop(app_id, None)
+        return released
+
+    def _place(self, app_id, level):
+        self.levels[app_id] = level
+        self._members[level].add(app_id)
+        self._sorted.pop(level, None)
+
+    def _unplace(self, app_id):
+        level = self.levels.pop(app_id, None)
+        if level is not None:
+            self._members[level].discard(app_id)
+            if not self._members[level]:
+                del self._members[level]
+            self._sorted.pop(level, None)
+        self.parent.pop(app_id, None)
+        self.blocked.discard(app_id)
+        self._closures.pop(app_id, None)
+
+    def relevel(self, seeds=None):
+        """Recompute levels for seeds and everything downstream of them (all when None)."""
+        if seeds is None:
+            affected = set(self.nodes)
+        else:
+            affected = {app_id for app_id in seeds if app_id in self.nodes}
+            pending = list(affected)
+            while pending:
+                for successor in self.successors.get(pending.pop(), ()):
+                    if successor not in affected:
+                        affected.add(successor)
+                        pending.append(successor)
+
+        for app_id in affected:
+            self._unplace(app_id)
+        indegree = {app_id: sum(p in affected for p in self.predecessors.get(app_id, ())) for app_id in affected}
+        ready = [app_id for app_id, degree in indegree.items() if not degree]
+        while ready:
+            app_id = ready.pop()
+            predecessors = self.predecessors.get(app_id)
+            if not predecessors:
+                self._place(app_id, 0)
+            elif any(p in self.blocked for p in predecessors):
+                self.blocked.add(app_id)
+            else:
+                # The predecessor a Kahn sort releases it with: latest wave, last in that wave
+                parent = max(predecessors, key=lambda p: (self.levels[p], self.rank(p)))
+                self._place(app_id, self.levels[parent] + 1)
+                self.parent[app_id] = parent
+            for successor in self.successors.get(app_id, ()):
+                if successor in affected:
+                    indegree[successor] -= 1
+                    if not indegree[successor]:
+                        ready.append(successor)
+        self.blocked.update(app_id for app_id, degree in indegree.items() if degree)
+
+    def _wave(self, level):
+        wave = self._sorted.get(level)
+        if wave is None:
+            wave = self._sorted[level] = sorted(self._members[level], key=self.rank)
+        return wave
+
+    def plan(self, app_ids=None):
+        """Assemble the ShutdownPlan for every application, or for a subset closed under predecessors."""
+        if app_ids is None:
+            # A level is only ever one past an occupied one, so levels are contiguous
+            waves = [self._wave(level) for level in range(len(self._members))]
+            blocked = self.blocked
+        else:
+            by_level = defaultdict(list)
+            for app_id in sorted((a for a in app_ids if a in self.levels), key=self.rank):
+                by_level[self.levels[app_id]].append(app_id)
+            waves = [by_level[level] for level in range(len(by_level))]
+            blocked = self.blocked.intersection(app_ids)
+
+        critical_path = []
+        if waves:
+            app_id = waves[-1][0]
+            while app_id is not None:
+                critical_path.append(app_id)
+                app_id = self.parent.get(app_id)
+            critical_path.reverse()
+        return ShutdownPlan(waves, find_cycles(blocked, self.successors), critical_path, sorted(blocked))
+
+    def ancestors(self, app_ids):
+        """app_ids plus everything that has to stop before them."""
+        needed = {app_id for app_id in app_ids if app_id in self.nodes}
+        pending = list(needed)
+        while pending:
+            for before in self.predecessors.get(pending.pop(), ()):
+                if before not in needed:
+                    needed.add(before)
+                    pending.append(before)
+        return needed
+
+    def upstream(self, app_id):
+        """Everything that has to stop before app_id, i.e. everything that depends on it."""
+        closure = self._closures.get(app_id)
+        if closure is None:
+            closure = self._closures[app_id] = frozenset(self.ancestors([app_id]) - {app_id})
+        return closure
+
+
+def build_plan(nodes, edges):
+    """Order applications with an iterative Kahn sort, grouped into waves.
+
+    `nodes` maps application id -> shutdown_order (None sorts last) and
+    `edges` is an iterable of (before, after) id pairs. Runs in
+    O(nodes + edges); edges naming unknown ids are ignored.
+    """
+    graph = DependencyGraph()
+    for app_id, shutdown_order in nodes.items():
+        graph.add_node(app_id, shutdown_order)
+    for before, after in edges:
+        graph.add_edge(before, after)
+    graph.relevel()
+    return graph.plan()
+
+
+def find_cycles(stuck, successors):
+    """Group the applications Kahn could not place into their cycles.
+
+    Iterative Tarjan over the unplaced subgraph; each strongly connected
+    component with more than one member is a cycle. Applications that only
+    wait on a cycle are left out, since fixing the cycle releases them.
+    """
+    index, lowlink, on_stack = {}, {}, set()
+    stack, cycles = [], []
+    counter = 0
+    for root in sorted(stuck):
+        if root in index:
+            continue
+        work = [(root, iter(successors.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in stuck:
+                    continue
+                if child not in index:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors.get(child, ()))))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        cycles.append(sorted(component))
+    return sorted(cycles)
+
+
+def _edges():
+    return (select(ApplicationDependency.dependency_id, ApplicationDependency.application_id)
+            .where(ApplicationDependency.dependency_type == 'shutdown_before'))
+
+
+def load_graph(session=None):
+    """Read (nodes, edges) for build_plan with two column queries."""
+    session = session or db.session
+    nodes = dict(session.execute(select(Application.id, Application.shutdown_order)).all())
+    return nodes, session.execute(_edges()).all()
+
+
+class PlanCache:
+    """Process-wide DependencyGraph kept in step with the database.
+
+    Changes to applications, dependencies or shutdown_order bump the 'plan'
+    data version. Sessions in this process also report the exact version
+    each of their flushes produced and which applications it touched. If
+    every version since the cached one was reported here, only those
+    applications are reloaded and re-levelled, together with everything
+    downstream of them. Anything else, such as a bulk import or a write
+    from another process, rebuilds the graph once. Readers get the cached
+    plan until the next change.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.rebuilds = 0
+        self.updates = 0
+        self._graph = None
+        self._plan = None
+        self._pending = {}
+        self._lock = Lock()
+
+    def note(self, changes):
+        """Record {plan version: touched application ids} for a committed transaction."""
+        with self._lock:
+            for version, touched in changes.items():
+                # The cache may already have been rebuilt past this commit
+                if self.version is None or version > self.version:
+                    self._pending.setdefault(version, set()).update(touched)
+
+    def clear(self):
+        with self._lock:
+            self.version = self._graph = self._plan = None
+            self._pending = {}
+
+    def _refresh(self, session):
+        version = current_version(PLAN, session)
+        if self._graph is not None and version == self.version:
+            return
+        missed = range(self.version + 1, version + 1) if self._graph is not None else ()
+        if missed and all(v in self._pending for v in missed):
+            self._update(set().union(*(self._pending[v] for v in missed)), session)
+            self.updates += 1
+        else:
+            nodes, edges = load_graph(session)
+            self._graph = DependencyGraph()
+            for app_id, shutdown_order in nodes.items():
+                self._graph.add_node(app_id, shutdown_order)
+            for before, after in edges:
+                self._graph.add_edge(before, after)
+            self._graph.relevel()
+            self.rebuilds += 1
+        # Whatever was reported up to this version is now part of the graph
+        self._pending = {v: touched for v, touched in self._pending.items() if v > version}
+        self.version = version
+        self._plan = None
+
+    def _update(self, touched, session):
+        graph = self._graph
+        ids = list(touched)
+        seeds = set(ids)
+        for app_id in ids:
+            seeds.update(graph.remove_node(app_id))
+        edges = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for app_id, shutdown_order in session.execute(
+                    select(Application.id, Application.shutdown_order).where(Application.id.in_(chunk))):
+                graph.add_node(app_id, shutdown_order)
+            edges.extend(session.execute(_edges().where(or_(ApplicationDependency.application_id.in_(chunk),
+                                                            ApplicationDependency.dependency_id.in_(chunk)))))
+        for before, after in edges:
+            graph.add_edge(before, after)
+        graph.relevel(seeds)
+
+    def plan(self, session=None):
+        """The plan for every application."""
+        with self._lock:
+            self._refresh(session or db.session)
+            if self._plan is None:
+                self._plan = self._graph.plan()
+            return self._plan
+
+    def plan_for(self, app_ids, session=None):
+        """The plan for app_ids together with everything that has to stop before them."""
+        with self._lock:
+            self._refresh(session or db.session)
+            # Levels only depend on predecessors, so they hold within the closed subset
+            return self._graph.plan(self._graph.ancestors(app_ids))
+
+    def impact(self, app_ids, session=None):
+        """Return (known app_ids, everything else that transitively depends on them)."""
+        with self._lock:
+            self._refresh(session or db.session)
+            sources = {app_id for app_id in app_ids if app_id in self._graph.nodes}
+            impacted = set()
+            for app_id in sources:
+                impacted |= self._graph.upstream(app_id)
+            return sources, impacted - sources
+
+
+plan_cache = PlanCache()
+
+
+def shutdown_plan(session=None):
+    """Plan a shutdown of every application."""
+    return plan_cache.plan(session)
+
+
+def plan_for(app_ids, session=None):
+    """Plan stopping app_ids together with everything that has to stop before them."""
+    return plan_cache.plan_for(app_ids, session)
+
+
+def shutdown_sequence(app_id, session=None):
+    """Ids of everything that has to stop before app_id, then app_id, in plan order."""
+    plan = plan_for([app_id], session)
+    # Anything held up by a cycle goes last rather than being dropped
+    return plan.order + plan.blocked
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_plan_changes(session, flush_context):
+    touched = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Application):
+            touched.add(obj.id)
+        elif isinstance(obj, ApplicationDependency):
+            touched.update((obj.application_id, obj.dependency_id))
+    for obj in session.dirty:
+        if isinstance(obj, Application):
+            if get_history(obj, 'shutdown_order').has_changes():
+                touched.add(obj.id)
+        elif isinstance(obj, ApplicationDependency):
+            histories = [get_history(obj, attr) for attr in ('application_id', 'dependency_id', 'dependency_type')]
+            if any(history.has_changes() for history in histories):
+                # Both the old and the new endpoints
+                for history in histories[:2]:
+                    touched.update(history.sum())
+    touched.discard(None)
+    if touched:
+        bump_version(PLAN, session)
+        # The version row stays locked until commit, so this is exactly the
+        # version the commit will publish
+        pending = session.info.setdefault('plan_changes', {})
+        pending.setdefault(current_version(PLAN, session), set()).update(touched)
+
+
+@event.listens_for(Session, 'after_commit')
+def _report_plan_changes(session):
+    pending = session.info.pop('plan_changes', None)
+    if pending:
+        plan_cache.note(pending)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_plan_changes(session, previous_transaction):
+    # The version bumps were rolled back with the rest of the transaction
+    session.info.pop('plan_changes', None)
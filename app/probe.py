@@ -0,0 +1,162 @@
+import asyncio
+import os
+import socket
+import logging
+from threading import Thread, Lock
+
+logger = logging.getLogger(__name__)
+
+PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', 1))
+PROBE_CONCURRENCY = int(os.environ.get('PROBE_CONCURRENCY', 500))
+PROBE_PER_HOST = int(os.environ.get('PROBE_PER_HOST', 4))
+PROBE_RESOLVE_TIMEOUT = float(os.environ.get('PROBE_RESOLVE_TIMEOUT', 5))
+
+
+class ProbeEngine:
+    """Concurrent TCP reachability probes built on asyncio.
+
+    A global semaphore caps the number of sockets open at once and a
+    per-host semaphore keeps a single machine from being flooded when it
+    runs many instances. Probes queue on their host's semaphore before
+    taking a global slot, so a busy host cannot starve the others.
+    """
+
+    def __init__(self, concurrency=PROBE_CONCURRENCY, per_host=PROBE_PER_HOST, timeout=PROBE_TIMEOUT,
+                 resolve_timeout=PROBE_RESOLVE_TIMEOUT):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.resolve_timeout = resolve_timeout
+        self._limit = None
+        self._host_limits = {}
+
+    def _acquire_host(self, host):
+        # [semaphore, probes using it]; entries are dropped once unused so a
+        # long-lived engine does not keep one per host it has ever seen
+        entry = self._host_limits.get(host)
+        if entry is None:
+            entry = self._host_limits[host] = [asyncio.Semaphore(self.per_host), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_host(self, host):
+        entry = self._host_limits[host]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._host_limits[host]
+
+    async def probe(self, host, port):
+        """Return (is_up, error) for a single host:port."""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.concurrency)
+        try:
+            port = int(port or 80)
+        except (TypeError, ValueError):
+            return False, "Connection failed"
+
+        host_limit = self._acquire_host(host)
+        try:
+            async with host_limit:
+                # Name resolution has its own timeout so a slow DNS server is
+                # not reported as the host being down
+                try:
+                    addresses = await asyncio.wait_for(
+                        asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM),
+                        timeout=self.resolve_timeout)
+                except asyncio.TimeoutError:
+                    return False, "Name resolution timed out"
+                except (OSError, UnicodeError):
+                    return False, "Name resolution failed"
+                address = addresses[0][4][0]
+
+                async with self._limit:
+                    try:
+                        _, writer = await asyncio.wait_for(
+                            asyncio.open_connection(address, port), timeout=self.timeout)
+                    except (asyncio.TimeoutError, OSError):
+                        return False, "Connection failed"
+                    except Exception as e:
+                        return False, str(e)
+                    writer.close()
+                    try:
+                        await writer.wait_closed()
+                    except OSError:
+                        pass
+                    return True, None
+        finally:
+            self._release_host(host)
+
+    async def probe_all(self, targets):
+        """Probe a list of (host, port) pairs, returning results in the same order."""
+        return await asyncio.gather(*(self.probe(host, port) for host, port in targets))
+
+    def run(self, targets):
+        """Blocking wrapper around probe_all for use from worker threads."""
+        if not targets:
+            return []
+        self._limit = None
+        self._host_limits = {}
+        return asyncio.run(self.probe_all(targets))
+
+
+class ProbeExecutor:
+    """Runs one ProbeEngine on a long-lived event loop thread.
+
+    Request handlers submit probes from any thread and get back
+    concurrent.futures.Future objects, so all in-flight checks in the
+    process share the engine's global and per-host limits instead of each
+    request spinning up its own loop.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or ProbeEngine()
+        self._loop = None
+        self._lock = Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                Thread(target=self._loop.run_forever, name='probe-executor', daemon=True).start()
+            return self._loop
+
+    def submit(self, host, port):
+        """Schedule a probe and return a Future resolving to (is_up, error)."""
+        return asyncio.run_coroutine_threadsafe(self.engine.probe(host, port), self._ensure_loop())
+
+    def shutdown(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """Return the process-wide ProbeExecutor, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProbeExecutor()
+        return _executor
+
+
+def _reset_after_fork():
+    # The loop thread does not survive a fork; children build their own
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def rollup_status(total, down_count):
+    """Collapse instance results into the application UP/PARTIAL/DOWN status."""
+    if down_count == 0:
+        return 'UP'
+    return 'PARTIAL' if down_count < total else 'DOWN'
@@ -0,0 +1,121 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from .utils import check_host_status, check_webui_status, check_db_status
+
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE_TTL = float(os.environ.get('PROBE_CACHE_TTL', 30))
+PROBE_CACHE_SIZE = int(os.environ.get('PROBE_CACHE_SIZE', 10000))
+PROBE_CACHE_WORKERS = int(os.environ.get('PROBE_CACHE_WORKERS', 32))
+
+
+class ProbeCache:
+    """Read-through cache of probe results with a TTL and an LRU size bound.
+
+    Concurrent lookups of the same stale key are coalesced: the first caller
+    runs the probe and everyone else waits on its result, so ten users
+    opening the same application probe each host once. Failed probes are
+    not cached.
+    """
+
+    def __init__(self, ttl=PROBE_CACHE_TTL, maxsize=PROBE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = Lock()
+
+    def get(self, key, probe):
+        """Return (value, checked_at) for key, calling probe() if it is missing or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            result = (probe(), datetime.utcnow())
+        except Exception as e:
+            with self._lock:
+                del self._inflight[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._entries[key] = (time.monotonic() + self.ttl,) + result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        pending.set_result(result)
+        return result
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+probe_cache = ProbeCache()
+
+
+def host_status(host, port=None):
+    return probe_cache.get(('host', host, port), lambda: check_host_status(host, port))
+
+
+def webui_status(url):
+    return probe_cache.get(('webui', url), lambda: check_webui_status(url))
+
+
+def db_status(db_host):
+    return probe_cache.get(('db', db_host), lambda: check_db_status(db_host))
+
+
+def instance_status(instance):
+    """Check an instance's (or system's) host, web UI and database through the cache.
+
+    Returns {'status': 'UP'|'DOWN', 'details': [...], 'last_checked': ...}
+    where last_checked is when the oldest result used was taken.
+    """
+    checks = [host_status(instance.host, instance.port)]
+    if getattr(instance, 'webui_url', None):
+        checks.append(webui_status(instance.webui_url))
+    if getattr(instance, 'db_host', None):
+        checks.append(db_status(instance.db_host))
+    return {
+        'status': 'UP' if all(ok for (ok, _), _ in checks) else 'DOWN',
+        'details': [detail for (_, details), _ in checks for detail in details],
+        'last_checked': min(checked_at for _, checked_at in checks)
+    }
+
+
+def instance_statuses(instances):
+    """Check many instances at once; cache misses are probed in parallel."""
+    if len(instances) <= 1:
+        return [instance_status(instance) for instance in instances]
+    with ThreadPoolExecutor(min(len(instances), PROBE_CACHE_WORKERS)) as pool:
+        return list(pool.map(instance_status, instances))
@@ -0,0 +1,209 @@
+import os
+from collections import defaultdict
+from .models import db, Team, Application, System, ApplicationInstance, application_systems
+
+MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+TEAM_FIELDS = {
+    'id': Team.id,
+    'name': Team.name,
+    'created_at': Team.created_at,
+    'updated_at': Team.updated_at,
+}
+
+SYSTEM_FIELDS = {
+    'id': System.id,
+    'name': System.name,
+    'host': System.host,
+    'port': System.port,
+    'status': System.status,
+    'created_at': System.created_at,
+    'updated_at': System.updated_at,
+}
+
+APPLICATION_FIELDS = {
+    'id': Application.id,
+    'name': Application.name,
+    'team_id': Application.team_id,
+    'team_name': Team.name,
+    'description': Application.description,
+    'webui_url': Application.webui_url,
+    'state': Application.state,
+    'shutdown_order': Application.shutdown_order,
+    'systems': None,  # loaded separately, see application_systems_for
+    'created_at': Application.created_at,
+    'updated_at': Application.updated_at,
+}
+
+
+class ListQueryError(ValueError):
+    """Raised for malformed pagination, projection or filter arguments."""
+
+
+def _int_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ListQueryError(f"'{name}' must be an integer")
+
+
+def page_args(args):
+    """Return (after, limit) from ?after=<id>&limit=<n>; limit is None when unbounded."""
+    after = _int_arg(args, 'after')
+    limit = _int_arg(args, 'limit')
+    if limit is not None:
+        if limit < 1:
+            raise ListQueryError("'limit' must be positive")
+        limit = min(limit, MAX_PAGE_SIZE)
+    return after, limit
+
+
+def requested_fields(args, available):
+    """Return the field names selected by ?fields=a,b,c (all fields by default).
+
+    The id is always included since it is the pagination cursor.
+    """
+    fields = args.get('fields')
+    if not fields:
+        return list(available)
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ListQueryError(f"Unknown fields: {', '.join(unknown)}")
+    names = list(dict.fromkeys(names))
+    if 'id' in names:
+        names.remove('id')
+    return ['id'] + names
+
+
+def select(available, fields):
+    """Build a query selecting only the SQL columns behind the given fields."""
+    columns = [available[name].label(name) for name in fields if available[name] is not None]
+    return db.session.query(*columns)
+
+
+def fetch_page(query, id_column, after, limit):
+    """Apply the keyset cursor and return (rows, next_after)."""
+    if after is not None:
+        query = query.filter(id_column > after)
+    query = query.order_by(id_column)
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+def rows_to_dicts(rows):
+    """Turn result tuples into plain dicts without hydrating ORM objects.
+
+    Datetimes are left as-is; the app's JSON provider encodes them.
+    """
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def application_systems_for(app_ids):
+    """Load the systems of many applications in one query, keyed by application id."""
+    systems = defaultdict(list)
+    if not app_ids:
+        return systems
+    query = (select(SYSTEM_FIELDS, SYSTEM_FIELDS)
+             .add_columns(application_systems.c.application_id)
+             .join(application_systems, System.id == application_systems.c.system_id)
+             .filter(application_systems.c.application_id.in_(app_ids))
+             .order_by(System.id))
+    for system in rows_to_dicts(query.all()):
+        systems[system.pop('application_id')].append(system)
+    return systems
+
+
+def list_teams(args):
+    fields = requested_fields(args, TEAM_FIELDS)
+    after, limit = page_args(args)
+    rows, next_after = fetch_page(select(TEAM_FIELDS, fields), Team.id, after, limit)
+    return rows_to_dicts(rows), next_after
+
+
+def list_systems(args):
+    fields = requested_fields(args, SYSTEM_FIELDS)
+    after, limit = page_args(args)
+    query = select(SYSTEM_FIELDS, fields)
+    if args.get('status'):
+        query = query.filter(System.status == args['status'])
+    rows, next_after = fetch_page(query, System.id, after, limit)
+    return rows_to_dicts(rows), next_after
+
+
+def list_applications(args):
+    """List applications with optional team, state and instance status filters.
+
+    ?team= accepts a team id or name, ?state= matches the application state
+    and ?status= keeps applications with at least one instance in that status.
+    """
+    fields = requested_fields(args, APPLICATION_FIELDS)
+    after, limit = page_args(args)
+    query = select(APPLICATION_FIELDS, fields).select_from(Application)
+    if 'team_name' in fields or (args.get('team') and not args['team'].isdigit()):
+        query = query.outerjoin(Team, Team.id == Application.team_id)
+
+    team = args.get('team')
+    if team:
+        query = query.filter(Application.team_id == int(team) if team.isdigit() else Team.name == team)
+    if args.get('state'):
+        query = query.filter(Application.state == args['state'])
+    if args.get('status'):
+        query = query.filter(db.session.query(ApplicationInstance.id).filter(
+            ApplicationInstance.application_id == Application.id,
+            ApplicationInstance.status == args['status']
+        ).exists())
+
+    rows, next_after = fetch_page(query, Application.id, after, limit)
+    apps = rows_to_dicts(rows)
+    if 'systems' in fields:
+        systems = application_systems_for([app['id'] for app in apps])
+        for app in apps:
+            app['systems'] = systems.get(app['id'], [])
+    return apps, next_after
+
+
+def summary():
+    """Application state and instance status counts, overall and per team.
+
+    Two GROUP BY queries do the counting in SQL, so the response size
+    depends on the number of teams and distinct statuses only.
+    """
+    teams = {team_id: {'id': team_id, 'name': name, 'applications': 0, 'instances': 0,
+                       'states': {}, 'statuses': {}}
+             for team_id, name in db.session.query(Team.id, Team.name).order_by(Team.id)}
+    totals = {'applications': 0, 'instances': 0, 'states': defaultdict(int), 'statuses': defaultdict(int)}
+
+    states = (db.session.query(Application.team_id, Application.state, db.func.count())
+              .group_by(Application.team_id, Application.state))
+    for team_id, state, count in states:
+        team = teams[team_id]
+        state = state or 'unknown'
+        team['states'][state] = count
+        team['applications'] += count
+        totals['states'][state] += count
+        totals['applications'] += count
+
+    statuses = (db.session.query(Application.team_id, ApplicationInstance.status, db.func.count())
+                .join(Application, Application.id == ApplicationInstance.application_id)
+                .group_by(Application.team_id, ApplicationInstance.status))
+    for team_id, status, count in statuses:
+        team = teams[team_id]
+        status = status or 'unknown'
+        team['statuses'][status] = count
+        team['instances'] += count
+        totals['statuses'][status] += count
+        totals['instances'] += count
+
+    return dict(totals, states=dict(totals['states']), statuses=dict(totals['statuses']),
+                teams=list(teams.values()))
@@ -0,0 +1,172 @@
+from collections import defaultdict
+from sqlalchemy import event, select, insert, update, delete, func, case, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from .models import db, Team, Application, ApplicationInstance, ApplicationStatusRollup, TeamStatusRollup
+from .probe import rollup_status
+
+COUNTS = ('up', 'down', 'unknown')
+
+_apps = ApplicationStatusRollup.__table__
+_teams = TeamStatusRollup.__table__
+
+
+def bucket(status):
+    """Map an instance status onto the up/down/unknown counters."""
+    return status if status in ('up', 'down') else 'unknown'
+
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def apply_transitions(rows, session=None):
+    """Adjust the counters for a batch of logged instance status transitions.
+
+    Takes StatusChange-shaped dicts (see app.changes); one executemany
+    UPDATE per table applies the net change for every application and team
+    touched, so a probe batch never rescans instances.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTS, 0))
+    for row in rows:
+        if row['entity'] != 'instance' or row['application_id'] is None:
+            continue
+        delta = deltas[row['application_id']]
+        delta[bucket(row['old_value'])] -= 1
+        delta[bucket(row['new_value'])] += 1
+    deltas = {app_id: delta for app_id, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+
+    connection = (session or db.session).connection()
+    team_deltas = defaultdict(lambda: dict.fromkeys(COUNTS, 0))
+    for app_ids in _chunks(deltas):
+        for app_id, team_id in connection.execute(
+                select(_apps.c.application_id, _apps.c.team_id).where(_apps.c.application_id.in_(app_ids))):
+            for name, value in deltas[app_id].items():
+                team_deltas[team_id][name] += value
+
+    _add(connection, _apps, _apps.c.application_id, deltas)
+    _add(connection, _teams, _teams.c.team_id, team_deltas)
+
+
+def _add(connection, table, key, deltas):
+    if not deltas:
+        return
+    connection.execute(
+        update(table).where(key == bindparam('row_key'))
+        .values({name: table.c[name] + bindparam(f'd_{name}') for name in COUNTS}),
+        [dict({f'd_{name}': value for name, value in delta.items()}, row_key=row_key)
+         for row_key, delta in deltas.items()])
+
+
+def refresh_rollups(app_ids=None, session=None):
+    """Recompute the rows of the given applications (all when None) from their instances.
+
+    Used when inventory changes rather than statuses: instances added or
+    removed, applications created, deleted or moved between teams. The
+    teams those applications belonged to before and after are recomputed
+    from the application rows.
+    """
+    connection = (session or db.session).connection()
+    instance = ApplicationInstance.__table__
+    counts = (select(
+        Application.id, Application.team_id,
+        func.coalesce(func.sum(case((instance.c.status == 'up', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((instance.c.status == 'down', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((instance.c.status == 'up', 0), (instance.c.status == 'down', 0),
+                                    (instance.c.id.isnot(None), 1), else_=0)), 0))
+        .select_from(Application.__table__.outerjoin(instance, instance.c.application_id == Application.id))
+        .group_by(Application.id, Application.team_id))
+    columns = ['application_id', 'team_id'] + list(COUNTS)
+
+    if app_ids is None:
+        connection.execute(delete(_apps))
+        connection.execute(insert(_apps).from_select(columns, counts))
+        _refresh_teams(None, connection)
+        return
+
+    team_ids = set()
+    for chunk in _chunks(set(app_ids)):
+        team_ids.update(connection.execute(
+            select(_apps.c.team_id).where(_apps.c.application_id.in_(chunk))).scalars())
+        connection.execute(delete(_apps).where(_apps.c.application_id.in_(chunk)))
+        connection.execute(insert(_apps).from_select(columns, counts.where(Application.id.in_(chunk))))
+        team_ids.update(connection.execute(
+            select(_apps.c.team_id).where(_apps.c.application_id.in_(chunk))).scalars())
+    _refresh_teams(team_ids, connection)
+
+
+def _refresh_teams(team_ids, connection):
+    totals = (select(_apps.c.team_id, func.count(), *(func.sum(_apps.c[name]) for name in COUNTS))
+              .group_by(_apps.c.team_id))
+    columns = ['team_id', 'applications'] + list(COUNTS)
+    if team_ids is None:
+        connection.execute(delete(_teams))
+        connection.execute(insert(_teams).from_select(columns, totals))
+        return
+    for chunk in _chunks(team_ids - {None}):
+        connection.execute(delete(_teams).where(_teams.c.team_id.in_(chunk)))
+        connection.execute(insert(_teams).from_select(columns, totals.where(_apps.c.team_id.in_(chunk))))
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_on_flush(session, flush_context):
+    refresh, transitions = set(), []
+    for obj in session.new | session.deleted:
+        if isinstance(obj, ApplicationInstance):
+            refresh.add(obj.application_id)
+        elif isinstance(obj, Application):
+            refresh.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Application):
+            if get_history(obj, 'team_id').has_changes() or get_history(obj, 'team_ref').has_changes():
+                refresh.add(obj.id)
+        elif isinstance(obj, ApplicationInstance):
+            moved = get_history(obj, 'application_id')
+            if moved.has_changes():
+                refresh.update(moved.added + moved.deleted)
+                continue
+            status = get_history(obj, 'status')
+            if status.added and status.deleted and status.added[0] != status.deleted[0]:
+                transitions.append({'entity': 'instance', 'application_id': obj.application_id,
+                                    'old_value': status.deleted[0], 'new_value': status.added[0]})
+
+    # A refreshed application is recounted from the flushed rows already
+    apply_transitions([t for t in transitions if t['application_id'] not in refresh], session)
+    refresh.discard(None)
+    if refresh:
+        refresh_rollups(refresh, session)
+
+
+def _with_status(row):
+    row = dict(row)
+    checked = row['up'] + row['down']
+    row['status'] = rollup_status(checked, row['down']) if checked else 'UNKNOWN'
+    return row
+
+
+def application_rollups(team_id=None, app_ids=None, session=None):
+    """Counts and UP/PARTIAL/DOWN status per application, optionally for one team or some ids."""
+    session = session or db.session
+    query = (select(_apps.c.application_id.label('id'), Application.name, _apps.c.team_id,
+                    *(_apps.c[name] for name in COUNTS))
+             .join(Application.__table__, Application.id == _apps.c.application_id)
+             .order_by(_apps.c.application_id))
+    if team_id is not None:
+        query = query.where(_apps.c.team_id == team_id)
+    if app_ids is None:
+        return [_with_status(row) for row in session.execute(query).mappings()]
+    return [_with_status(row) for chunk in _chunks(sorted(app_ids))
+            for row in session.execute(query.where(_apps.c.application_id.in_(chunk))).mappings()]
+
+
+def team_rollups():
+    """Application and instance counts per team, including teams with no applications."""
+    query = (select(Team.id, Team.name,
+                    *(func.coalesce(_teams.c[name], 0).label(name) for name in ('applications',) + COUNTS))
+             .outerjoin(_teams, _teams.c.team_id == Team.id)
+             .order_by(Team.id))
+    return [_with_status(row) for row in db.session.execute(query).mappings()]
@@ -1,23 +1,68 @@
-from flask import Blueprint, jsonify, request, render_template
-from .models import db, Team, Application, System
+import os
+import csv
+import shutil
+import tempfile
+from functools import partial
+from itertools import islice
+from sqlalchemy.exc import IntegrityError
+from flask import Blueprint, Response, jsonify, request, render_template, current_app, url_for, stream_with_context
+from .models import db, Team, Application, System, ApplicationInstance
+from .jobs import jobs
+from .versioning import conditional
+from .changes import changes_since
+from .events import event_stream
+from .checks import resolve_targets, target_batches, check_targets, save_instance_statuses, StatusCheckError
+from .probe import rollup_status
+from .probe_cache import instance_statuses
+from .rollups import application_rollups, team_rollups
+from .planner import shutdown_plan, plan_for
+from .shutdown import ShutdownExecutor
+from .impact import impact
+from .queries import list_teams, list_systems, list_applications, summary, ListQueryError
+from .importer import import_csv, import_csv_parallel, open_text_stream, CSVImportError, IMPORT_MODES, REQUIRED_COLUMNS
 
 main = Blueprint('main', __name__)
 
+# Probe results in the running/stopped vocabulary systems are shown with
+SYSTEM_STATUSES = {'UP': 'running', 'DOWN': 'stopped'}
+
 @main.route('/')
 def index():
     return render_template('index.html')
 
+def _list_response(lister):
+    """Run a list query from request.args and return it as a JSON array.
+
+    When more rows exist past ?limit, the cursor for the next page is sent
+    in the X-Next-After header and a Link: rel="next" header.
+    """
+    try:
+        items, next_after = lister(request.args)
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(items)
+    if next_after is not None:
+        args = request.args.to_dict()
+        args['after'] = next_after
+        response.headers['X-Next-After'] = str(next_after)
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
 @main.route('/api/teams', methods=['GET'])
+@conditional
 def get_teams():
-    teams = Team.query.all()
-    return jsonify([team.to_dict() for team in teams])
+    return _list_response(list_teams)
 
 @main.route('/api/teams', methods=['POST'])
 def create_team():
     data = request.get_json()
     team = Team(name=data['name'])
     db.session.add(team)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': f"Team '{data['name']}' already exists"}), 409
     return jsonify(team.to_dict())
 
 @main.route('/api/teams/<int:team_id>', methods=['DELETE'])
@@ -28,9 +73,9 @@ def delete_team(team_id):
     return '', 204
 
 @main.route('/api/applications', methods=['GET'])
+@conditional
 def get_applications():
-    apps = Application.query.all()
-    return jsonify([app.to_dict() for app in apps])
+    return _list_response(list_applications)
 
 @main.route('/api/applications', methods=['POST'])
 def create_application():
@@ -87,10 +132,114 @@ def get_application_systems(app_id):
     app = Application.query.get_or_404(app_id)
     return jsonify([system.to_dict() for system in app.systems])
 
+@main.route('/api/summary', methods=['GET'])
+@conditional
+def get_summary():
+    """Per-team and overall application state and instance status counts."""
+    return jsonify(summary())
+
+@main.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Instance statuses and application states changed after ?since=<version>."""
+    since = request.args.get('since')
+    if since is not None and not since.isdigit():
+        return jsonify({'error': "'since' must be a non-negative integer"}), 400
+    return jsonify(changes_since(int(since) if since is not None else None))
+
+@main.route('/api/events', methods=['GET'])
+def stream_events():
+    """Push status changes as Server-Sent Events.
+
+    Each message is an /api/changes delta with the log version as its id;
+    reconnecting clients resume from Last-Event-ID (or ?since=). Every open
+    stream occupies a worker, so serve this with threaded or gevent workers.
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is not None and not since.isdigit():
+        return jsonify({'error': "'since' must be a non-negative integer"}), 400
+    stream = event_stream(int(since) if since is not None else None, db.session)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/api/status/check', methods=['POST'])
+def bulk_status_check():
+    """Probe many applications or instances at once, streaming NDJSON results.
+
+    Takes {"applications": [ids] | "all"} and/or {"instances": [ids] | "all"}.
+    Targets are read in batches and probed concurrently on the shared probe
+    executor, so the request takes about as long as the slowest host per
+    batch window, with no cap on the number of instances.
+    """
+    try:
+        targets = resolve_targets(request.get_json(silent=True))
+    except StatusCheckError as e:
+        return jsonify({'error': str(e)}), 400
+    dumps = current_app.json.dumps
+
+    def stream():
+        for result in check_targets(target_batches(targets)):
+            yield dumps(result) + '\n'
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+@main.route('/api/status/applications', methods=['GET'])
+@conditional
+def get_application_rollups():
+    """Instance status counts per application from the rollup table, optionally ?team=<id>."""
+    team = request.args.get('team')
+    if team is not None and not team.isdigit():
+        return jsonify({'error': "'team' must be a team id"}), 400
+    return jsonify(application_rollups(int(team) if team is not None else None))
+
+@main.route('/api/status/teams', methods=['GET'])
+@conditional
+def get_team_rollups():
+    return jsonify(team_rollups())
+
+@main.route('/check_status/<int:app_id>', methods=['GET'])
+def check_status(app_id):
+    """Check every instance of an application, answering from the probe cache when fresh."""
+    app = Application.query.get_or_404(app_id)
+    instances = sorted(app.instances, key=lambda instance: instance.id)
+    results = instance_statuses(instances)
+    save_instance_statuses(instances, results)
+    down = sum(result['status'] == 'DOWN' for result in results)
+    return jsonify({
+        'status': 'success',
+        'app_status': rollup_status(len(results), down) if results else 'UNKNOWN',
+        'last_checked': min((result['last_checked'] for result in results), default=None),
+        'results': [dict(result, instance_id=instance.id, host=instance.host, port=instance.port)
+                    for instance, result in zip(instances, results)]
+    })
+
+@main.route('/check_instance_status/<int:instance_id>', methods=['GET'])
+def check_instance_status(instance_id):
+    instance = ApplicationInstance.query.get_or_404(instance_id)
+    [result] = instance_statuses([instance])
+    save_instance_statuses([instance], [result])
+    return jsonify({
+        'status': 'success',
+        'instance_status': result['status'],
+        'details': result['details'],
+        'last_checked': result['last_checked']
+    })
+
+@main.route('/check_all_status', methods=['GET'])
+def check_all_status():
+    """Check every system, answering from the probe cache when fresh."""
+    systems = System.query.order_by(System.id).all()
+    for system, result in zip(systems, instance_statuses(systems)):
+        status = SYSTEM_STATUSES[result['status']]
+        if system.status != status:
+            system.status = status
+    db.session.commit()
+    return jsonify({'status': 'success', 'checked': len(systems)})
+
 @main.route('/api/systems', methods=['GET'])
+@conditional
 def get_systems():
-    systems = System.query.all()
-    return jsonify([system.to_dict() for system in systems])
+    return _list_response(list_systems)
 
 @main.route('/api/systems', methods=['POST'])
 def create_system():
@@ -121,139 +270,210 @@ def preview_csv():
     if not file.filename.endswith('.csv'):
         return jsonify({"error": "Invalid file format. Please upload a CSV file"}), 400
     
-    # Create a temporary file to store the uploaded content
-    with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp_file:
-        file.save(temp_file.name)
-        
-        # Read CSV headers and preview data
-        with open(temp_file.name, 'r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            headers = reader.fieldnames
-            preview = []
-            for i, row in enumerate(reader):
-                if i >= 5:  # Only show first 5 rows
-                    break
-                preview.append(row)
-        
-        os.unlink(temp_file.name)
-        
-        required_fields = ['name', 'team', 'host', 'port']
-        optional_fields = ['webui_url', 'db_host', 'description']
-        
-        return jsonify({
-            "headers": headers,
-            "preview": preview,
-            "required_fields": required_fields,
-            "optional_fields": optional_fields
-        })
+    try:
+        reader = csv.DictReader(open_text_stream(file.stream))
+        headers = reader.fieldnames
+        # Only the first 5 rows are decoded; the rest of the upload is never read
+        preview = list(islice(reader, 5))
+    except UnicodeDecodeError:
+        return jsonify({"error": "Invalid file encoding. Please use UTF-8"}), 400
+    
+    required_fields = ['name', 'team', 'host', 'port']
+    optional_fields = ['webui_url', 'db_host', 'description']
+    
+    return jsonify({
+        "headers": headers,
+        "preview": preview,
+        "required_fields": required_fields,
+        "optional_fields": optional_fields
+    })
 
-@main.route('/import_apps', methods=['POST'])
-def import_apps():
+def _validate_upload():
+    """Return (file, mode, None) for a valid import request, or an error response."""
     if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+        return None, None, (jsonify({'error': 'No file provided'}), 400)
     
     file = request.files['file']
     if not file or not file.filename.endswith('.csv'):
-        return jsonify({'error': 'Invalid file format. Please upload a CSV file'}), 400
+        return None, None, (jsonify({'error': 'Invalid file format. Please upload a CSV file'}), 400)
+
+    mode = request.form.get('mode', 'replace')
+    if mode not in IMPORT_MODES:
+        return None, None, (jsonify({'error': f'Invalid import mode. Use one of: {", ".join(IMPORT_MODES)}'}), 400)
+    return file, mode, None
+
+def _is_parallel():
+    return request.form.get('parallel') in ('1', 'true', 'on')
+
+@main.route('/import_apps', methods=['POST'])
+def import_apps():
+    file, mode, error = _validate_upload()
+    if error:
+        return error
 
     try:
-        content = file.stream.read().decode("UTF8")
-        if not content.strip():
-            return jsonify({'error': 'CSV file is empty'}), 400
-            
-        stream = StringIO(content)
-        csv_input = csv.DictReader(stream)
-        
-        if not csv_input.fieldnames:
-            return jsonify({'error': 'CSV file has no headers'}), 400
-        
-        required_fields = ['name', 'team_name', 'host']
-        missing_headers = [field for field in required_fields if field not in csv_input.fieldnames]
-        if missing_headers:
-            return jsonify({
-                'error': f'Missing required columns: {", ".join(missing_headers)}',
-                'required': required_fields
-            }), 400
-        
-        # Clean existing data
-        try:
-            ApplicationInstance.query.delete()
-            Application.query.delete()
-            Team.query.delete()
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({'error': f'Failed to clean existing data: {str(e)}'}), 500
-        
-        imported = 0
-        skipped = 0
-        errors = []
-        
-        for row_num, row in enumerate(csv_input, start=2):
+        if _is_parallel():
+            path = _spool_upload(file)
             try:
-                # Validate required fields
-                missing_fields = [field for field in required_fields if not row.get(field, '').strip()]
-                if missing_fields:
-                    errors.append(f"Row {row_num}: Missing values for {', '.join(missing_fields)}")
-                    skipped += 1
-                    continue
-
-                # Find or create team
-                team_name = row['team_name'].strip()
-                team = Team.query.filter_by(name=team_name).first()
-                if not team:
-                    team = Team(name=team_name)
-                    db.session.add(team)
-                    db.session.flush()
-
-                # Create application
-                app = Application(
-                    name=row['name'].strip(),
-                    team_id=team.id
-                )
-                db.session.add(app)
-                db.session.flush()
-
-                # Create instance with validation
-                port = row.get('port', '').strip()
-                instance = ApplicationInstance(
-                    application_id=app.id,
-                    host=row['host'].strip(),
-                    port=int(port) if port.isdigit() else None,
-                    webui_url=row.get('webui_url', '').strip() or None,
-                    db_host=row.get('db_host', '').strip() or None,
-                    status='unknown'  # Default to unknown, will be updated by monitoring
-                )
-                db.session.add(instance)
-                imported += 1
-
-            except ValueError as ve:
-                errors.append(f"Row {row_num}: Invalid value - {str(ve)}")
-                skipped += 1
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-                skipped += 1
-                continue
-
-        if imported > 0:
-            db.session.commit()
+                stats = import_csv_parallel(path, mode=mode)
+            finally:
+                os.unlink(path)
         else:
-            db.session.rollback()
-            return jsonify({'error': 'No valid records to import', 'errors': errors}), 400
+            csv_input = csv.DictReader(open_text_stream(file.stream))
+            if csv_input.fieldnames is None:
+                return jsonify({'error': 'CSV file is empty'}), 400
+            stats = import_csv(csv_input, mode=mode)
+
+        if not stats.imported:
+            return jsonify({'error': 'No valid records to import', 'errors': stats.errors}), 400
         
-        return jsonify({
-            'imported': imported,
-            'skipped': skipped,
-            'message': f'Successfully imported {imported} applications',
-            'errors': errors if errors else None
-        })
+        return jsonify(dict(
+            stats.to_dict(),
+            message=f'Successfully imported {stats.imported} applications'
+        ))
 
+    except CSVImportError as e:
+        return jsonify({'error': str(e), 'required': REQUIRED_COLUMNS}), 400
     except UnicodeDecodeError:
         return jsonify({'error': 'Invalid file encoding. Please use UTF-8'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _spool_upload(file):
+    """Copy the upload to a temp file that outlives the request, returning its path."""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            shutil.copyfileobj(file.stream, temp_file)
+        if not os.path.getsize(path):
+            raise CSVImportError('CSV file is empty')
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+def _run_import_job(job, app, path, mode, parallel):
+    def report(stats):
+        job.update(**{k: v for k, v in stats.to_dict().items() if k != 'errors'})
+
+    with app.app_context():
+        if parallel:
+            stats = import_csv_parallel(path, mode=mode, progress=report)
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                stats = import_csv(csv.DictReader(f), mode=mode, progress=report)
+
+        job.progress.update({k: v for k, v in stats.to_dict().items() if k != 'errors'})
+        if not stats.imported:
+            job.progress['errors'] = stats.errors
+            raise CSVImportError('No valid records to import')
+        return dict(stats.to_dict(), message=f'Successfully imported {stats.imported} applications')
+
+@main.route('/api/import_jobs', methods=['POST'])
+def submit_import_job():
+    file, mode, error = _validate_upload()
+    if error:
+        return error
+
+    try:
+        path = _spool_upload(file)
+    except CSVImportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    job = jobs.submit('import', _run_import_job, current_app._get_current_object(), path, mode, _is_parallel(),
+                      cleanup=partial(os.unlink, path))
+    return jsonify({
+        'job_id': job.id,
+        'status_url': url_for('main.get_import_job', job_id=job.id)
+    }), 202
+
+@main.route('/api/import_jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != 'import':
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@main.route('/api/import_jobs/<job_id>', methods=['DELETE'])
+def cancel_import_job(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != 'import':
+        return jsonify({'error': 'Job not found'}), 404
+    job.cancel()
+    return jsonify(job.to_dict()), 202
+
+@main.route('/api/shutdown_plan', methods=['GET'])
+@conditional
+def get_shutdown_plan():
+    """Shutdown waves for every application, with cycles and the critical path."""
+    names = dict(db.session.query(Application.id, Application.name))
+    return jsonify(shutdown_plan().to_dict(names))
+
+@main.route('/api/impact', methods=['GET'])
+@conditional
+def get_impact():
+    """Every application that transitively depends on ?host= or ?app=."""
+    host, app_id = request.args.get('host'), request.args.get('app')
+    if (host is None) == (app_id is None):
+        return jsonify({'error': "Provide either 'host' or 'app'"}), 400
+    if app_id is not None:
+        try:
+            app_id = int(app_id)
+        except ValueError:
+            return jsonify({'error': "'app' must be an application id"}), 400
+
+    sources, impacted = impact(host=host, app_id=app_id)
+    if app_id is not None and not sources:
+        return jsonify({'error': 'Application not found'}), 404
+    ids = sorted(sources | impacted)
+    names = {}
+    for i in range(0, len(ids), 500):
+        names.update(db.session.query(Application.id, Application.name).filter(Application.id.in_(ids[i:i + 500])))
+    label = lambda app_ids: [{'id': i, 'name': names.get(i)} for i in sorted(app_ids)]
+    return jsonify({
+        'host': host,
+        'application': app_id,
+        'sources': label(sources),
+        'impacted': label(impacted),
+        'count': len(impacted)
+    })
+
+def _run_shutdown_job(job, app, app_ids):
+    with app.app_context():
+        plan = shutdown_plan() if app_ids == 'all' else plan_for(app_ids)
+        job.update(waves=len(plan.waves), applications=len(plan.order), wave=0)
+        return ShutdownExecutor().run(plan, job=job)
+
+@main.route('/api/shutdown_jobs', methods=['POST'])
+def submit_shutdown_job():
+    """Shut down {"applications": [ids] | "all"}, plus whatever has to stop before them."""
+    app_ids = (request.get_json(silent=True) or {}).get('applications')
+    if app_ids != 'all' and not (isinstance(app_ids, list) and app_ids
+                                 and all(isinstance(i, int) and not isinstance(i, bool) for i in app_ids)):
+        return jsonify({'error': "'applications' must be a list of ids or \"all\""}), 400
+
+    job = jobs.submit('shutdown', _run_shutdown_job, current_app._get_current_object(), app_ids)
+    return jsonify({
+        'job_id': job.id,
+        'status_url': url_for('main.get_shutdown_job', job_id=job.id)
+    }), 202
+
+@main.route('/api/shutdown_jobs/<job_id>', methods=['GET'])
+def get_shutdown_job(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != 'shutdown':
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@main.route('/api/shutdown_jobs/<job_id>', methods=['DELETE'])
+def cancel_shutdown_job(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != 'shutdown':
+        return jsonify({'error': 'Job not found'}), 404
+    job.cancel()
+    return jsonify(job.to_dict()), 202
+
 @main.route('/shutdown_app/<int:app_id>', methods=['POST'])
 def shutdown_app(app_id):
     try:
@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from itertools import groupby
+from .models import db, Application, ApplicationInstance
+from .probe import get_executor
+from .status_sink import SQLStatusSink
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_WORKERS = int(os.environ.get('SHUTDOWN_WORKERS', 8))
+SHUTDOWN_VERIFY_TIMEOUT = float(os.environ.get('SHUTDOWN_VERIFY_TIMEOUT', 300))
+SHUTDOWN_POLL_INTERVAL = float(os.environ.get('SHUTDOWN_POLL_INTERVAL', 5))
+
+
+class ShutdownExecutor:
+    """Carries out a ShutdownPlan wave by wave.
+
+    Every application of a wave is stopped concurrently on up to `workers`
+    threads. Its instances go in ascending `sequence` order: each group
+    shares a sequence value. Each group must probe as down before the next
+    group starts. A wave must be fully down before the next wave starts,
+    so a whole run takes as long as the plan's critical path.
+
+    `stop`, if given, is called with each instance dict to send the actual
+    stop; without it the executor tracks and verifies a shutdown carried
+    out by the application owners. Worker threads only stop and probe. The
+    calling thread commits every step: application state, then instance
+    statuses through a SQLStatusSink. That way the change log, rollups and
+    event stream follow the run as it happens.
+
+    If an application is not down within verify_timeout, it is left
+    'inProgress' and the run halts after that wave. Later waves depend on
+    it and are reported as skipped.
+    """
+
+    def __init__(self, stop=None, probes=None, workers=SHUTDOWN_WORKERS,
+                 verify_timeout=SHUTDOWN_VERIFY_TIMEOUT, poll_interval=SHUTDOWN_POLL_INTERVAL, session=None):
+        self.stop = stop
+        self.probes = probes or get_executor()
+        self.workers = workers
+        self.verify_timeout = verify_timeout
+        self.poll_interval = poll_interval
+        self.session = session or db.session
+
+    def run(self, plan, job=None):
+        """Execute plan, reporting progress to job (see app.jobs) when given."""
+        result = {'waves': len(plan.waves), 'completed': [], 'failed': [], 'skipped': list(plan.blocked)}
+        instances = self._load(plan.order)
+        halted = False
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shutdown') as pool:
+            for number, wave in enumerate(plan.waves, start=1):
+                if halted:
+                    result['skipped'].extend(wave)
+                    continue
+                self._start(wave, instances)
+                futures = {pool.submit(self._stop_application, instances[app_id], job): app_id for app_id in wave}
+                for future in as_completed(futures):
+                    app_id = futures[future]
+                    try:
+                        statuses = future.result()
+                    except Exception:
+                        logger.exception(f"Stopping application {app_id} failed")
+                        statuses = {}
+                    stopped = self._finish(app_id, instances[app_id], statuses)
+                    result['completed' if stopped else 'failed'].append(app_id)
+                halted = bool(result['failed'])
+                if job is not None:
+                    job.update(wave=number, completed=len(result['completed']), failed=len(result['failed']))
+        return result
+
+    def _load(self, app_ids):
+        instances = {app_id: [] for app_id in app_ids}
+        rows = (self.session.query(ApplicationInstance.id, ApplicationInstance.application_id,
+                                   ApplicationInstance.host, ApplicationInstance.port,
+                                   ApplicationInstance.status, ApplicationInstance.sequence)
+                .filter(ApplicationInstance.application_id.in_(app_ids))
+                .order_by(ApplicationInstance.sequence, ApplicationInstance.id))
+        for row in rows:
+            instances[row.application_id].append(row._asdict())
+        return instances
+
+    def _start(self, wave, instances):
+        for app in self.session.query(Application).filter(Application.id.in_(wave)):
+            app.state = 'inProgress'
+        with SQLStatusSink(self.session, ApplicationInstance) as sink:
+            for app_id in wave:
+                for instance in instances[app_id]:
+                    sink.add(instance['id'], {'status': 'in_progress'})
+        # Apps without instances still need their state committed
+        self.session.commit()
+
+    def _finish(self, app_id, instances, statuses):
+        """Persist the outcome for one application; returns whether it is fully down."""
+        stopped = len(statuses) == len(instances) and all(status == 'down' for status, _ in statuses.values())
+        if stopped:
+            self.session.get(Application, app_id).state = 'completed'
+        with SQLStatusSink(self.session, ApplicationInstance) as sink:
+            for instance in instances:
+                # Groups never reached keep the status they had before the run
+                status, checked_at = statuses.get(instance['id'], (instance['status'], None))
+                fields = {'status': status}
+                if checked_at:
+                    fields['last_check'] = checked_at
+                sink.add(instance['id'], fields)
+        self.session.commit()
+        if not stopped:
+            logger.warning(f"Application {app_id} did not stop within {self.verify_timeout}s")
+        return stopped
+
+    def _stop_application(self, instances, job):
+        """Stop and verify each sequence group; returns {instance_id: (status, checked_at)}."""
+        statuses = {}
+        for _, group in groupby(instances, key=lambda instance: instance['sequence'] or 1):
+            group = list(group)
+            if self.stop:
+                for instance in group:
+                    self.stop(instance)
+            statuses.update(self._wait_down(group, job))
+            if any(status != 'down' for status, _ in statuses.values()):
+                break
+        return statuses
+
+    def _wait_down(self, group, job):
+        deadline = time.monotonic() + self.verify_timeout
+        statuses = {}
+        pending = group
+        while pending:
+            futures = [(instance, self.probes.submit(instance['host'], instance['port'])) for instance in pending]
+            checked_at = datetime.utcnow()
+            still_up = []
+            for instance, future in futures:
+                is_up, _ = future.result()
+                statuses[instance['id']] = ('up' if is_up else 'down', checked_at)
+                if is_up:
+                    still_up.append(instance)
+            pending = still_up
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0 or (job is not None and job.cancelled):
+                break
+            time.sleep(min(self.poll_interval, remaining))
+        return statuses
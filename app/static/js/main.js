@@ -1,3 +1,18 @@
+// One EventSource per page, shared by every script that wants status changes.
+// It reconnects on its own and resumes from the last event id.
+let statusEvents = null;
+
+// Call handler with each pushed /api/changes delta; returns an unsubscribe function
+function onStatusChanges(handler) {
+    if (!statusEvents) {
+        statusEvents = new EventSource('/api/events');
+        window.addEventListener('beforeunload', () => statusEvents.close());
+    }
+    const listener = event => handler(JSON.parse(event.data));
+    statusEvents.addEventListener('changes', listener);
+    return () => statusEvents.removeEventListener('changes', listener);
+}
+
 // Update teams list
 function updateTeamsList() {
     fetch('/api/teams')
@@ -113,23 +128,27 @@ function runTest(appId) {
     .catch(error => showAlert('danger', 'Error starting test'));
 }
 
-// Poll test status
-function pollTestStatus(appId, interval = 2000) {
+// Follow test status: load the systems once, then react to pushed system transitions
+function pollTestStatus(appId) {
     const statusElement = document.getElementById(`test-status-${appId}`);
     if (!statusElement) return;
 
-    const checkStatus = () => {
+    let systemIds = new Set();
+    let unsubscribe = null;
+    const refresh = () => {
         fetch(`/api/applications/${appId}/systems`)
             .then(response => response.json())
             .then(systems => {
+                systemIds = new Set(systems.map(system => system.id));
                 const allRunning = systems.every(system => system.status === 'running');
                 statusElement.innerHTML = `
                     <span class="badge bg-${allRunning ? 'success' : 'warning'}">
                         ${allRunning ? 'All Systems Running' : 'Systems Starting'}
                     </span>
                 `;
-                if (!allRunning) {
-                    setTimeout(checkStatus, interval);
+                if (allRunning && unsubscribe) {
+                    unsubscribe();
+                    unsubscribe = null;
                 }
             })
             .catch(error => {
@@ -139,17 +158,29 @@ function pollTestStatus(appId, interval = 2000) {
             });
     };
 
-    checkStatus();
+    unsubscribe = onStatusChanges(changes => {
+        if (changes.reset || changes.systems.some(change => systemIds.has(change.id))) {
+            refresh();
+        }
+    });
+    refresh();
 }
 
 // Initialize
 document.addEventListener('DOMContentLoaded', function() {
-    updateTeamsList();
-    updateApplicationsList();
-    
-    // Set up auto-refresh
-    setInterval(updateTeamsList, 10000);
-    setInterval(updateApplicationsList, 10000);
+    const teamsList = document.getElementById('teamsList');
+    const applicationLists = ['notStartedList', 'inProgressList', 'completedList']
+        .some(id => document.getElementById(id));
+    if (teamsList) updateTeamsList();
+    if (applicationLists) {
+        updateApplicationsList();
+        // Reload the lists when an application changes state instead of polling
+        onStatusChanges(changes => {
+            if (changes.reset || changes.applications.length > 0) {
+                updateApplicationsList();
+            }
+        });
+    }
 });
 
 // Drag and drop functions
@@ -0,0 +1,111 @@
+import os
+import abc
+import time
+import logging
+from threading import Lock
+from pymongo import UpdateOne
+from app.models import ApplicationInstance
+from app.versioning import bump_version
+from app.changes import record_instance_statuses, prune_changes
+
+logger = logging.getLogger(__name__)
+
+SINK_MAX_BATCH = int(os.environ.get('STATUS_SINK_MAX_BATCH', 1000))
+SINK_MAX_DELAY = float(os.environ.get('STATUS_SINK_MAX_DELAY', 2))
+
+
+class StatusSink(abc.ABC):
+    """Buffers probe outcomes and writes them back in batches.
+
+    Results are flushed once max_batch updates are pending or the oldest
+    pending update is max_delay seconds old, whichever comes first. add()
+    checks the age itself; a sweep loop that can go quiet, for instance
+    while it waits on slow probes, calls flush_due() so the last results
+    are not held back. Use the sink as a context manager so the tail of a
+    sweep is flushed on exit.
+    """
+
+    def __init__(self, max_batch=SINK_MAX_BATCH, max_delay=SINK_MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.flushed = 0
+        self._pending = []
+        self._oldest = None
+        self._lock = Lock()
+
+    def add(self, key, fields):
+        """Queue a status update for the record identified by key."""
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((key, fields))
+            due = (len(self._pending) >= self.max_batch
+                   or time.monotonic() - self._oldest >= self.max_delay)
+        if due:
+            self.flush()
+
+    def flush_due(self):
+        """Flush if the oldest pending update is max_delay seconds old; returns the number written."""
+        with self._lock:
+            due = self._pending and time.monotonic() - self._oldest >= self.max_delay
+        return self.flush() if due else 0
+
+    def flush(self):
+        """Write every pending update in a single round trip."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._oldest = None
+        if not pending:
+            return 0
+        self._write(pending)
+        self.flushed += len(pending)
+        return len(pending)
+
+    @abc.abstractmethod
+    def _write(self, pending):
+        """Write [(key, fields), ...] to the backing store in one round trip."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+class MongoStatusSink(StatusSink):
+    """Flushes updates to a Mongo collection as one unordered bulk_write."""
+
+    def __init__(self, collection, **kwargs):
+        super().__init__(**kwargs)
+        self.collection = collection
+
+    def _write(self, pending):
+        ops = [UpdateOne({'_id': key}, {'$set': fields}) for key, fields in pending]
+        self.collection.bulk_write(ops, ordered=False)
+
+
+class SQLStatusSink(StatusSink):
+    """Flushes updates to a SQLAlchemy model with bulk_update_mappings.
+
+    Every mapping carries the same columns, so SQLAlchemy emits them as a
+    single executemany UPDATE keyed on the primary key. Instance status
+    transitions are appended to the change log in the same transaction.
+    """
+
+    def __init__(self, session, model, **kwargs):
+        super().__init__(**kwargs)
+        self.session = session
+        self.model = model
+
+    def _write(self, pending):
+        mappings = [dict(fields, id=key) for key, fields in pending]
+        try:
+            if self.model is ApplicationInstance:
+                record_instance_statuses(mappings, self.session)
+                prune_changes(session=self.session)
+            self.session.bulk_update_mappings(self.model, mappings)
+            bump_version(session=self.session)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
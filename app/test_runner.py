@@ -1,15 +1,16 @@
 import os
 import time
 import logging
-import subprocess
 from datetime import datetime
-from pymongo import MongoClient
+from app.database import get_client, ensure_indexes
+from app.status_sink import MongoStatusSink
+from app.icmp import IcmpSweeper
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def get_db():
-    client = MongoClient(os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/shutdown_manager'))
+    client = get_client(os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/shutdown_manager'))
     return client.get_default_database()
 
 def check_system_status():
@@ -20,41 +21,32 @@ def check_system_status():
     try:
         # Get all systems
         systems = list(db.systems.find())
-        for system in systems:
-            try:
-                host = system.get('host')
-                if not host:
-                    logger.error(f"System {system['_id']} has no host")
-                    continue
+        # One ICMP sweep covers every host instead of a ping process each
+        replies = IcmpSweeper(timeout=2).sweep(system.get('host') for system in systems)
+        with MongoStatusSink(db.systems) as sink:
+            for system in systems:
+                try:
+                    host = system.get('host')
+                    if not host:
+                        logger.error(f"System {system['_id']} has no host")
+                        continue
                     
-                logger.info(f"Testing {host}")
-                
-                # Simple ping test
-                ping_cmd = ['ping', '-c', '1', '-W', '2', host]
-                result = subprocess.run(ping_cmd, capture_output=True, text=True)
-                
-                # Update system status
-                new_status = 'running' if result.returncode == 0 else 'stopped'
-                db.systems.update_one(
-                    {'_id': system['_id']},
-                    {'$set': {
+                    # Queue system status update
+                    new_status = 'running' if replies.get(host) is not None else 'stopped'
+                    sink.add(system['_id'], {
                         'status': new_status,
                         'last_checked': datetime.utcnow()
-                    }}
-                )
-                
-                logger.info(f"System {host} status updated to: {new_status}")
-                
-            except Exception as e:
-                logger.error(f"Error checking system {system.get('host', 'unknown')}: {str(e)}")
-                # Set status to unknown on error
-                db.systems.update_one(
-                    {'_id': system['_id']},
-                    {'$set': {
+                    })
+                    
+                    logger.info(f"System {host} status updated to: {new_status}")
+                    
+                except Exception as e:
+                    logger.error(f"Error checking system {system.get('host', 'unknown')}: {str(e)}")
+                    # Set status to unknown on error
+                    sink.add(system['_id'], {
                         'status': 'unknown',
                         'last_checked': datetime.utcnow()
-                    }}
-                )
+                    })
     
     except Exception as e:
         logger.error(f"Error in system check: {str(e)}")
@@ -63,6 +55,11 @@ def main():
     """Main loop to check systems every hour"""
     logger.info("Starting system monitor service")
     
+    try:
+        ensure_indexes(get_db())
+    except Exception as e:
+        logger.error(f"Error creating indexes: {str(e)}")
+    
     while True:
         try:
             check_system_status()
@@ -1,11 +1,12 @@
 import requests
-from ping3 import ping
 from urllib.parse import urlparse
 import socket
 from datetime import datetime
 from typing import Dict, Optional, Any
-import os
 import logging
+from .models import Application
+from .planner import shutdown_sequence
+from .icmp import get_pinger
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -66,7 +67,7 @@ def check_host_status(host, port=None):
     # Try ICMP ping
     try:
         logger.info(f"Attempting to ping {host}")
-        response_time = ping(host, timeout=1)
+        response_time = get_pinger().ping(host)
         logger.info(f"Ping response for {host}: {response_time}")
         
         if response_time is None or response_time is False:
@@ -206,8 +207,7 @@ def ping_check(host):
     except (socket.timeout, socket.error):
         try:
             # Fallback to ICMP ping if TCP fails
-            response = os.system(f"ping -c 1 -W 2 {host} > /dev/null 2>&1")
-            if response == 0:
+            if get_pinger().ping(host) is not None:
                 return {"status": "up", "message": "Host is responding to ping"}
             return {"status": "down", "message": "Host is not responding to ping"}
         except:
@@ -228,27 +228,11 @@ def get_application_status(app) -> Dict[str, Any]:
     
     return status
 
-def get_shutdown_sequence(app, visited=None):
+def get_shutdown_sequence(app):
     """Get the sequence of applications that need to be shut down."""
-    if visited is None:
-        visited = set()
-    
-    if app.id in visited:
-        return []
-    
-    visited.add(app.id)
-    sequence = []
-    
-    # First get dependencies
-    for dep in app.dependencies:
-        if dep.dependency_type == 'shutdown_before':
-            sequence.extend(get_shutdown_sequence(dep.application, visited))
-    
-    # Add current app if not already in sequence
-    if app not in sequence:
-        sequence.append(app)
-    
-    return sequence
+    ids = shutdown_sequence(app.id)
+    apps = {a.id: a for a in Application.query.filter(Application.id.in_(ids))}
+    return [apps[app_id] for app_id in ids if app_id in apps]
 
 def clean_csv_value(value):
     """Clean and validate a CSV value."""
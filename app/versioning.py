@@ -0,0 +1,58 @@
+import zlib
+from functools import wraps
+from itertools import chain
+from flask import request, make_response
+from sqlalchemy import event, update, insert, select
+from sqlalchemy.orm import Session
+from .models import db, DataVersion
+
+DATA = 'data'
+
+
+def current_version(name=DATA, session=None):
+    """Return the current value of a version counter (0 if never bumped)."""
+    session = session or db.session
+    return session.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+
+def bump_version(name=DATA, session=None):
+    """Increment a version counter inside the session's current transaction.
+
+    Bulk writes that bypass the unit of work (Core inserts,
+    bulk_update_mappings, query.delete) must call this themselves.
+    """
+    connection = (session or db.session).connection()
+    result = connection.execute(update(DataVersion.__table__)
+                                .where(DataVersion.name == name)
+                                .values(version=DataVersion.version + 1))
+    if not result.rowcount:
+        connection.execute(insert(DataVersion.__table__).values(name=name, version=1))
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_flush(session, flush_context):
+    if any(not isinstance(obj, DataVersion)
+           for obj in chain(session.new, session.dirty, session.deleted)):
+        bump_version(session=session)
+
+
+def conditional(view):
+    """Serve a view with a strong ETag derived from the data version.
+
+    The version is read before the view runs, so a write that lands while
+    the body is built can only make the next poll refetch, never hide a
+    change. Matching If-None-Match requests get an empty 304.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f'{current_version()}-{zlib.crc32(request.full_path.encode()):08x}'
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -1,86 +1,117 @@
-import socket
+import os
 import time
 from datetime import datetime
 from threading import Thread
 from flask import current_app
 from app.database import get_db
-from app.models import Application, ApplicationInstance
+from app.probe import ProbeEngine, rollup_status, PROBE_CONCURRENCY, PROBE_PER_HOST, PROBE_TIMEOUT
+from app.status_sink import MongoStatusSink, SQLStatusSink
+from app.models import db as sql_db, ApplicationInstance
 
-def check_status(host, port):
-    """Check if host:port is accessible"""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)  # Reduced timeout
-        result = sock.connect_ex((host, int(port or 80)))
-        sock.close()
-        return True if result == 0 else False, None
-    except (socket.gaierror, socket.timeout, ValueError):
-        return False, "Connection failed"
-    except Exception as e:
-        return False, str(e)
+APP_BATCH_SIZE = 500
+INSTANCE_BATCH_SIZE = int(os.environ.get('CHECK_INSTANCE_BATCH_SIZE', 2000))
+CHECK_INTERVAL = int(os.environ.get('CHECK_INTERVAL', 60))
+# 'sql' probes the SQLAlchemy inventory and feeds the change log behind
+# /api/changes and /api/events; 'mongo' updates the legacy Mongo collections
+STATUS_CHECK_BACKEND = os.environ.get('STATUS_CHECK_BACKEND', 'sql')
+
+def _probe_engine(app):
+    return ProbeEngine(
+        concurrency=app.config.get('PROBE_CONCURRENCY', PROBE_CONCURRENCY),
+        per_host=app.config.get('PROBE_PER_HOST', PROBE_PER_HOST),
+        timeout=app.config.get('PROBE_TIMEOUT', PROBE_TIMEOUT)
+    )
+
+def sql_status_check(app, engine=None):
+    """Probe every SQL inventory instance and write the statuses through a SQLStatusSink"""
+    with app.app_context():
+        engine = engine or _probe_engine(app)
+        last_id = 0
+        # Keyset batches keep memory bounded; the sink commits as it flushes, so
+        # transitions reach the change log, rollups and event stream mid-sweep
+        with SQLStatusSink(sql_db.session, ApplicationInstance) as sink:
+            while True:
+                batch = (sql_db.session.query(ApplicationInstance.id, ApplicationInstance.host,
+                                              ApplicationInstance.port)
+                         .filter(ApplicationInstance.id > last_id)
+                         .order_by(ApplicationInstance.id)
+                         .limit(INSTANCE_BATCH_SIZE).all())
+                if not batch:
+                    break
+                results = engine.run([(host, port) for _, host, port in batch])
+                checked_at = datetime.utcnow()
+                for (instance_id, _, _), (is_up, _) in zip(batch, results):
+                    sink.add(instance_id, {'status': 'up' if is_up else 'down', 'last_check': checked_at})
+                last_id = batch[-1].id
+                # The next batch blocks on probes, so write this one's results now
+                sink.flush()
+        return sink.flushed
 
 def background_status_check(app):
     """Background task to check all application statuses"""
     with app.app_context():
         try:
             db = get_db()
+            engine = _probe_engine(app)
             
-            # Get all applications
-            applications = list(db.applications.find())
-            
-            # Process in smaller batches
-            batch_size = 5
-            for i in range(0, len(applications), batch_size):
-                batch = applications[i:i+batch_size]
-                
-                for app_data in batch:
-                    # Get all instances for this application
-                    instances = list(db.instances.find({'application_id': app_data['_id']}))
-                    total_instances = len(instances)
-                    down_count = 0
+            # Probe a batch of applications at a time so memory stays bounded
+            # while every instance in the batch is checked concurrently
+            applications = db.applications.find({}, {'_id': 1})
+            with MongoStatusSink(db.instances) as instance_sink, \
+                    MongoStatusSink(db.applications) as app_sink:
+                for batch in _batches(applications, APP_BATCH_SIZE):
+                    app_ids = [app_data['_id'] for app_data in batch]
+                    instances = list(db.instances.find(
+                        {'application_id': {'$in': app_ids}},
+                        {'application_id': 1, 'host': 1, 'port': 1}
+                    ))
+                    results = engine.run([(i['host'], i.get('port')) for i in instances])
+                    checked_at = datetime.utcnow()
                     
-                    for instance_data in instances:
-                        is_up, error = check_status(instance_data['host'], instance_data.get('port'))
-                        
-                        # Update instance status
-                        db.instances.update_one(
-                            {'_id': instance_data['_id']},
-                            {
-                                '$set': {
-                                    'status': 'UP' if is_up else 'DOWN',
-                                    'error_message': None if is_up else error,
-                                    'last_checked': datetime.utcnow()
-                                }
-                            }
-                        )
+                    totals = dict.fromkeys(app_ids, 0)
+                    down_counts = dict.fromkeys(app_ids, 0)
+                    for instance_data, (is_up, error) in zip(instances, results):
+                        instance_sink.add(instance_data['_id'], {
+                            'status': 'UP' if is_up else 'DOWN',
+                            'error_message': None if is_up else error,
+                            'last_checked': checked_at
+                        })
                         
+                        totals[instance_data['application_id']] += 1
                         if not is_up:
-                            down_count += 1
+                            down_counts[instance_data['application_id']] += 1
                     
-                    # Update application status
-                    app_status = 'UP' if down_count == 0 else 'PARTIAL' if down_count < total_instances else 'DOWN'
-                    db.applications.update_one(
-                        {'_id': app_data['_id']},
-                        {'$set': {'status': app_status}}
-                    )
-                    
-                # Sleep between batches to reduce load
-                time.sleep(1)
+                    for app_id in app_ids:
+                        app_sink.add(app_id, {
+                            'status': rollup_status(totals[app_id], down_counts[app_id])
+                        })
+                    # The next batch blocks on probes, so write this one's results now
+                    instance_sink.flush()
+                    app_sink.flush()
                 
         except Exception as e:
             app.logger.error(f"Error in background status check: {str(e)}")
-        finally:
-            # Sleep before next round
-            time.sleep(60)
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 def run_checker(app):
+    check = sql_status_check if STATUS_CHECK_BACKEND == 'sql' else background_status_check
     while True:
         with app.app_context():
             try:
-                background_status_check(app)
+                check(app)
             except Exception as e:
                 app.logger.error(f"Background checker error: {str(e)}")
-                time.sleep(60)  # Sleep on error before retrying
+        # Sleep before next round
+        time.sleep(CHECK_INTERVAL)
 
 def start_background_checker(app):
     """Start the background checker thread."""
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Compare list-endpoint serialization paths per 10k rows.
+
+    python benchmarks/serialization.py [rows]
+
+Both paths build the same application fields (everything the list
+endpoint returns, systems included). Hydration, turning the database
+rows into dicts, is timed on its own for the ORM path (Application
+objects and to_dict()) and the projection path used by the list
+endpoints (SQL result tuples). Encoding is then timed separately for
+stdlib json and the app's JSON provider on the same payload, so the
+encoder choice and the hydration cost are not mixed up.
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app, db
+from app.models import Team, Application, System, application_systems
+from app.queries import APPLICATION_FIELDS, list_applications
+
+FIELDS = list(APPLICATION_FIELDS)
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = create_app()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Team.__table__.insert(), [{'name': f'Team {i}'} for i in range(20)])
+        db.session.execute(System.__table__.insert(), [
+            {'name': f'System {i}', 'host': f'sys{i}.example.com', 'port': 443, 'status': 'up'}
+            for i in range(50)
+        ])
+        db.session.execute(Application.__table__.insert(), [
+            {'name': f'App {i}', 'team_id': i % 20 + 1, 'description': 'benchmark', 'state': 'running'}
+            for i in range(rows)
+        ])
+        db.session.execute(application_systems.insert(), [
+            {'application_id': i + 1, 'system_id': i % 50 + 1} for i in range(rows)
+        ])
+        db.session.commit()
+
+        def orm_rows():
+            db.session.expunge_all()
+            return [{name: value for name, value in a.to_dict().items() if name in APPLICATION_FIELDS}
+                    for a in Application.query.all()]
+
+        def projection_rows():
+            return list_applications({'fields': ','.join(FIELDS)})[0]
+
+        orm, projection = orm_rows(), projection_rows()
+        assert len(orm) == len(projection) == rows
+        assert sorted(orm[0]) == sorted(projection[0]) == sorted(FIELDS), 'paths build different fields'
+
+        def stdlib(payload):
+            return json.dumps(payload, default=app.json.default)
+
+        scale = 10000 / rows
+        print(f'Hydration, {len(FIELDS)} fields per row:')
+        for label, fn in [('ORM + to_dict', orm_rows), ('SQL rows (projection)', projection_rows)]:
+            print(f'  {label:28s} {timed(fn) * scale * 1000:8.1f} ms per 10k rows')
+
+        encoder = f"{type(app.json).__name__} ({'orjson' if 'orjson' in sys.modules else 'stdlib'})"
+        print('Encoding the projection payload:')
+        for label, fn in [('stdlib json', stdlib), (encoder, app.json.dumps)]:
+            print(f'  {label:28s} {timed(lambda: fn(projection)) * scale * 1000:8.1f} ms per 10k rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""add lookup indexes
+
+Root revision. On an empty database it creates the base tables
+(teams, applications, systems, application_systems and
+application_instances) as db.create_all() built them before migrations
+were introduced; existing tables are left alone and only get the indexes.
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_teams_name', 'teams', ['name'], True),
+    ('ix_applications_name', 'applications', ['name'], False),
+    ('ix_applications_team_id', 'applications', ['team_id'], False),
+    ('ix_application_instances_application_id_status', 'application_instances',
+        ['application_id', 'status'], False),
+    ('ix_application_instances_status', 'application_instances', ['status'], False),
+    ('ix_application_instances_host', 'application_instances', ['host'], False),
+]
+
+
+def _create_base_tables(inspector):
+    timestamps = [sa.Column('created_at', sa.DateTime(), nullable=True),
+                  sa.Column('updated_at', sa.DateTime(), nullable=True)]
+    if not inspector.has_table('teams'):
+        op.create_table(
+            'teams',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            *[column.copy() for column in timestamps],
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('applications'):
+        op.create_table(
+            'applications',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('team_id', sa.Integer(), nullable=False),
+            sa.Column('description', sa.String(length=500), nullable=True),
+            sa.Column('webui_url', sa.String(length=200), nullable=True),
+            sa.Column('state', sa.String(length=50), nullable=True),
+            *[column.copy() for column in timestamps],
+            sa.ForeignKeyConstraint(['team_id'], ['teams.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('systems'):
+        op.create_table(
+            'systems',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('host', sa.String(length=200), nullable=False),
+            sa.Column('port', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            *[column.copy() for column in timestamps],
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('application_systems'):
+        op.create_table(
+            'application_systems',
+            sa.Column('application_id', sa.Integer(), nullable=False),
+            sa.Column('system_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['application_id'], ['applications.id']),
+            sa.ForeignKeyConstraint(['system_id'], ['systems.id']),
+            sa.PrimaryKeyConstraint('application_id', 'system_id')
+        )
+    if not inspector.has_table('application_instances'):
+        op.create_table(
+            'application_instances',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('application_id', sa.Integer(), nullable=False),
+            sa.Column('host', sa.String(length=100), nullable=False),
+            sa.Column('port', sa.Integer(), nullable=True),
+            sa.Column('webui_url', sa.String(length=200), nullable=True),
+            sa.Column('db_host', sa.String(length=100), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('last_check', sa.DateTime(), nullable=True),
+            *[column.copy() for column in timestamps],
+            sa.Column('sequence', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['application_id'], ['applications.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def _existing_indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    _create_base_tables(sa.inspect(op.get_bind()))
+
+    # Merge teams that share a name so the unique index can be built
+    op.execute("""
+        UPDATE applications SET team_id = (
+            SELECT MIN(keep.id) FROM teams keep
+            WHERE keep.name = (SELECT dup.name FROM teams dup WHERE dup.id = applications.team_id)
+        )
+    """)
+    op.execute("DELETE FROM teams WHERE id NOT IN (SELECT MIN(id) FROM teams GROUP BY name)")
+
+    # Tables created by db.create_all() already carry these indexes
+    for name, table, columns, unique in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
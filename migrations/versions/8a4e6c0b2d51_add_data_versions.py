@@ -0,0 +1,30 @@
+"""add data versions
+
+Revision ID: 8a4e6c0b2d51
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c0b2d51'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('data_versions'):
+        op.create_table(
+            'data_versions',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('version', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade():
+    op.drop_table('data_versions')
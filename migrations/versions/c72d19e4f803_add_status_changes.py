@@ -0,0 +1,36 @@
+"""add status changes
+
+Revision ID: c72d19e4f803
+Revises: 8a4e6c0b2d51
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c72d19e4f803'
+down_revision = '8a4e6c0b2d51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('status_changes'):
+        op.create_table(
+            'status_changes',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('entity', sa.String(length=20), nullable=False),
+            sa.Column('entity_id', sa.Integer(), nullable=False),
+            sa.Column('application_id', sa.Integer(), nullable=True),
+            sa.Column('field', sa.String(length=20), nullable=False),
+            sa.Column('old_value', sa.String(length=50), nullable=True),
+            sa.Column('new_value', sa.String(length=50), nullable=True),
+            sa.Column('changed_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('status_changes')
@@ -0,0 +1,66 @@
+"""add status rollups
+
+Revision ID: d4b8e1f25a67
+Revises: c72d19e4f803
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e1f25a67'
+down_revision = 'c72d19e4f803'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('application_status_rollups'):
+        op.create_table(
+            'application_status_rollups',
+            sa.Column('application_id', sa.Integer(), nullable=False),
+            sa.Column('team_id', sa.Integer(), nullable=True),
+            sa.Column('up', sa.Integer(), nullable=False),
+            sa.Column('down', sa.Integer(), nullable=False),
+            sa.Column('unknown', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('application_id')
+        )
+        op.create_index('ix_application_status_rollups_team_id', 'application_status_rollups', ['team_id'])
+    if not inspector.has_table('team_status_rollups'):
+        op.create_table(
+            'team_status_rollups',
+            sa.Column('team_id', sa.Integer(), nullable=False),
+            sa.Column('applications', sa.Integer(), nullable=False),
+            sa.Column('up', sa.Integer(), nullable=False),
+            sa.Column('down', sa.Integer(), nullable=False),
+            sa.Column('unknown', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('team_id')
+        )
+
+    # Backfill from the current inventory
+    op.execute("DELETE FROM application_status_rollups")
+    op.execute("""
+        INSERT INTO application_status_rollups (application_id, team_id, up, down, unknown)
+        SELECT a.id, a.team_id,
+               COALESCE(SUM(CASE WHEN i.status = 'up' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN i.status = 'down' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN i.status = 'up' OR i.status = 'down' THEN 0
+                                 WHEN i.id IS NOT NULL THEN 1 ELSE 0 END), 0)
+        FROM applications a LEFT JOIN application_instances i ON i.application_id = a.id
+        GROUP BY a.id, a.team_id
+    """)
+    op.execute("DELETE FROM team_status_rollups")
+    op.execute("""
+        INSERT INTO team_status_rollups (team_id, applications, up, down, unknown)
+        SELECT team_id, COUNT(*), SUM(up), SUM(down), SUM(unknown)
+        FROM application_status_rollups GROUP BY team_id
+    """)
+
+
+def downgrade():
+    op.drop_table('team_status_rollups')
+    op.drop_index('ix_application_status_rollups_team_id', table_name='application_status_rollups')
+    op.drop_table('application_status_rollups')
@@ -0,0 +1,46 @@
+"""add application dependencies
+
+Revision ID: e91a3c7d5b20
+Revises: d4b8e1f25a67
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91a3c7d5b20'
+down_revision = 'd4b8e1f25a67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'shutdown_order' not in {column['name'] for column in inspector.get_columns('applications')}:
+        op.add_column('applications', sa.Column('shutdown_order', sa.Integer(), nullable=True))
+    if not inspector.has_table('application_dependencies'):
+        op.create_table(
+            'application_dependencies',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('application_id', sa.Integer(), nullable=False),
+            sa.Column('dependency_id', sa.Integer(), nullable=False),
+            sa.Column('dependency_type', sa.String(length=20), nullable=False),
+            sa.ForeignKeyConstraint(['application_id'], ['applications.id']),
+            sa.ForeignKeyConstraint(['dependency_id'], ['applications.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('application_id', 'dependency_id', name='uq_application_dependencies_pair')
+        )
+        op.create_index('ix_application_dependencies_application_id', 'application_dependencies',
+                        ['application_id'])
+        op.create_index('ix_application_dependencies_dependency_id', 'application_dependencies',
+                        ['dependency_id'])
+
+
+def downgrade():
+    op.drop_index('ix_application_dependencies_dependency_id', table_name='application_dependencies')
+    op.drop_index('ix_application_dependencies_application_id', table_name='application_dependencies')
+    op.drop_table('application_dependencies')
+    with op.batch_alter_table('applications') as batch_op:
+        batch_op.drop_column('shutdown_order')
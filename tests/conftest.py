@@ -0,0 +1,49 @@
+import pytest
+import sqlalchemy
+from app import create_app, db
+from app.models import Team, Application, ApplicationInstance
+from app.planner import plan_cache
+from app.impact import host_index
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    # Every test starts from a fresh database whose versions restart at zero
+    plan_cache.clear()
+    host_index.clear()
+    
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.drop_all()
+
+@pytest.fixture
+def statements(client):
+    """Record the SQL statements executed while the test runs."""
+    recorded = []
+    engine = db.get_engine()
+    record = lambda conn, cursor, statement, *args: recorded.append(statement)
+    sqlalchemy.event.listen(engine, 'before_cursor_execute', record)
+    yield recorded
+    sqlalchemy.event.remove(engine, 'before_cursor_execute', record)
+
+@pytest.fixture
+def inventory(client):
+    """Factory that adds applications of one team with the given instances.
+
+    Takes {application name: [(host, port), ...]} and returns the committed
+    applications by name.
+    """
+    def add(apps, team='Test Team'):
+        team = Team.query.filter_by(name=team).first() or Team(name=team)
+        created = {}
+        for name, targets in apps.items():
+            created[name] = Application(name=name, team_ref=team)
+            created[name].instances = [ApplicationInstance(host=host, port=port) for host, port in targets]
+        db.session.add_all(created.values())
+        db.session.commit()
+        return created
+    return add
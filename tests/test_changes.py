@@ -0,0 +1,83 @@
+from unittest.mock import patch
+from app import db
+from app.models import ApplicationInstance, System
+from app.status_sink import SQLStatusSink
+from app.worker import sql_status_check
+
+def _one_app(inventory):
+    app = inventory({'TestApp': [(f'host{i}', 80) for i in range(3)]})['TestApp']
+    return app.id, sorted(i.id for i in app.instances)
+
+def test_changes_feed_reports_probe_transitions(client, inventory):
+    """Test only instances whose status changed are returned"""
+    app_id, instance_ids = _one_app(inventory)
+    version = client.get('/api/changes').get_json()['version']
+
+    with SQLStatusSink(db.session, ApplicationInstance) as sink:
+        sink.add(instance_ids[0], {'status': 'up'})
+        sink.add(instance_ids[1], {'status': 'unknown'})  # unchanged
+        sink.add(instance_ids[2], {'status': 'down'})
+
+    data = client.get(f'/api/changes?since={version}').get_json()
+    assert sorted((c['id'], c['status']) for c in data['instances']) == [
+        (instance_ids[0], 'up'), (instance_ids[2], 'down')]
+    assert data['instances'][0]['application_id'] == app_id
+    assert [(r['id'], r['status'], r['up'], r['down']) for r in data['rollups']] == [(app_id, 'PARTIAL', 1, 1)]
+    assert data['version'] > version
+    assert not data['more'] and not data['reset']
+
+    version = data['version']
+    with SQLStatusSink(db.session, ApplicationInstance) as sink:
+        sink.add(instance_ids[0], {'status': 'down'})
+        sink.add(instance_ids[0], {'status': 'up'})
+    data = client.get(f'/api/changes?since={version}').get_json()
+    assert [(c['id'], c['status']) for c in data['instances']] == [(instance_ids[0], 'up')]
+    assert data['version'] == version + 2
+
+def test_changes_feed_reports_orm_updates(client, inventory):
+    """Test changes made through the ORM, such as a shutdown, are logged"""
+    app_id, instance_ids = _one_app(inventory)
+    version = client.get('/api/changes').get_json()['version']
+
+    client.post(f'/shutdown_app/{app_id}')
+    data = client.get(f'/api/changes?since={version}').get_json()
+    assert data['applications'] == [
+        {'id': app_id, 'state': 'completed', 'changed_at': data['applications'][0]['changed_at']}]
+    assert {c['status'] for c in data['instances']} == {'in_progress'}
+    assert len(data['instances']) == 3
+
+    assert client.get(f"/api/changes?since={data['version']}").get_json()['instances'] == []
+    assert client.get('/api/changes?since=999999').get_json()['reset']
+    assert client.get('/api/changes?since=x').status_code == 400
+
+def test_changes_feed_reports_system_statuses(client):
+    """Test system status updates reach the feed so pages can follow them without polling"""
+    system = System(name='Gateway', host='gw1', port=443, status='unknown')
+    db.session.add(system)
+    db.session.commit()
+    version = client.get('/api/changes').get_json()['version']
+
+    assert system.status == 'unknown'
+    system.status = 'running'
+    db.session.commit()
+    data = client.get(f'/api/changes?since={version}').get_json()
+    assert [(c['id'], c['status']) for c in data['systems']] == [(system.id, 'running')]
+    assert data['instances'] == [] and data['rollups'] == []
+
+def test_sql_background_check_logs_transitions(client, inventory):
+    """Test the SQL background check probes every instance in batches and logs transitions"""
+    app_id, instance_ids = _one_app(inventory)
+    version = client.get('/api/changes').get_json()['version']
+    batches = []
+    class Engine:
+        def run(self, targets):
+            batches.append(targets)
+            return [(host != 'host1', None) for host, _ in targets]
+
+    with patch('app.worker.INSTANCE_BATCH_SIZE', 2):
+        assert sql_status_check(client.application, engine=Engine()) == 3
+    assert [len(batch) for batch in batches] == [2, 1]
+    data = client.get(f'/api/changes?since={version}').get_json()
+    assert sorted((c['id'], c['status']) for c in data['instances']) == [
+        (instance_ids[0], 'up'), (instance_ids[1], 'down'), (instance_ids[2], 'up')]
+    assert all(i.last_check for i in ApplicationInstance.query)
@@ -0,0 +1,101 @@
+import json
+import socket
+import time
+from concurrent.futures import Future
+from app import db
+from app.models import ApplicationInstance
+from app.probe import ProbeEngine, ProbeExecutor
+import app.checks
+
+def _lines(rv):
+    return [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+
+def test_bulk_check_streams_ndjson(client, inventory, monkeypatch):
+    """Test one request probes every instance and rolls up each application"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    open_port = listener.getsockname()[1]
+    closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    local = lambda *ports: [('127.0.0.1', port) for port in ports]
+    apps = inventory({'Healthy': local(open_port, open_port), 'Degraded': local(open_port, closed_port),
+                      'Other': local(closed_port)})
+    executor = ProbeExecutor(ProbeEngine(timeout=1))
+    monkeypatch.setattr(app.checks, 'get_executor', lambda: executor)
+    try:
+        # Read the whole stream before the executor goes away
+        rv = client.post('/api/status/check',
+                         json={'applications': [apps['Healthy'].id, apps['Degraded'].id]})
+        results = _lines(rv)
+    finally:
+        listener.close()
+        executor.shutdown()
+
+    assert rv.status_code == 200
+    assert rv.mimetype == 'application/x-ndjson'
+    instances = [r for r in results if r['type'] == 'instance']
+    assert len(instances) == 4
+    assert {(r['id'], r['status']) for r in instances} == {
+        (i.id, 'up' if i.port == open_port else 'down')
+        for a in ('Healthy', 'Degraded') for i in apps[a].instances}
+    rollups = {r['id']: r['status'] for r in results if r['type'] == 'application'}
+    assert rollups == {apps['Healthy'].id: 'UP', apps['Degraded'].id: 'PARTIAL'}
+
+    # Results are written back, and the other application was left alone
+    statuses = dict(db.session.query(ApplicationInstance.id, ApplicationInstance.status))
+    assert statuses[apps['Other'].instances[0].id] == 'unknown'
+    assert {i.port: statuses[i.id] for i in apps['Degraded'].instances} == {open_port: 'up', closed_port: 'down'}
+
+def test_bulk_check_takes_as_long_as_the_slowest_host(client, inventory, monkeypatch):
+    """Test probes for every instance are in flight at the same time"""
+    class SlowEngine(ProbeEngine):
+        async def probe(self, host, port):
+            import asyncio
+            await asyncio.sleep(0.3)
+            return True, None
+
+    inventory({f'App{i}': [('127.0.0.1', 80), ('127.0.0.1', 81)] for i in range(10)})
+    executor = ProbeExecutor(SlowEngine())
+    monkeypatch.setattr(app.checks, 'get_executor', lambda: executor)
+    started = time.monotonic()
+    try:
+        results = _lines(client.post('/api/status/check', json='all'))
+    finally:
+        executor.shutdown()
+
+    assert time.monotonic() - started < 2
+    assert len([r for r in results if r['type'] == 'instance']) == 20
+    assert {r['status'] for r in results if r['type'] == 'application'} == {'UP'}
+
+def test_bulk_check_reads_targets_in_batches(client, inventory, statements, monkeypatch):
+    """Test "all" is checked batch by batch, with no cap, and applications spanning batches roll up once"""
+    apps = inventory({f'App{i}': [('up', 80), ('up', 81), ('down' if i % 3 == 0 else 'up', 82)]
+                      for i in range(10)})
+    class Executor:
+        def submit(self, host, port):
+            future = Future()
+            future.set_result((host == 'up', None))
+            return future
+    monkeypatch.setattr(app.checks, 'get_executor', Executor)
+    monkeypatch.setattr(app.checks, 'CHECK_BATCH_SIZE', 4)
+
+    statements.clear()
+    results = _lines(client.post('/api/status/check', json='all'))
+    batches = [s for s in statements if 'FROM application_instances' in s and 'LIMIT' in s]
+    assert len(batches) == 8
+    assert len([r for r in results if r['type'] == 'instance']) == 30
+    rollups = [(i, r) for i, r in enumerate(results) if r['type'] == 'application']
+    assert {r['id']: r['status'] for _, r in rollups} == {
+        a.id: 'PARTIAL' if name in ('App0', 'App3', 'App6', 'App9') else 'UP' for name, a in apps.items()}
+    for position, rollup in rollups:
+        # Every rollup follows the last result of its application
+        assert sum(r['application_id'] == rollup['id'] for r in results[:position] if r['type'] == 'instance') == 3
+
+def test_bulk_check_rejects_bad_targets(client):
+    assert client.post('/api/status/check', json={}).status_code == 400
+    assert client.post('/api/status/check', json={'applications': ['x']}).status_code == 400
+    assert client.post('/api/status/check', data='nope').status_code == 400
@@ -0,0 +1,58 @@
+import pytest
+from app import db
+from app.models import ApplicationInstance
+from app.status_sink import SQLStatusSink
+from app.events import Broadcaster, broadcaster
+
+@pytest.fixture
+def manual_broadcaster(monkeypatch):
+    """Run the broadcaster's polling by hand instead of on its thread"""
+    monkeypatch.setattr(broadcaster, '_run', lambda app: None)
+    yield broadcaster
+    broadcaster._subscribers.clear()
+    broadcaster.version = None
+
+def _read(stream, count):
+    return [next(stream).decode() for _ in range(count)]
+
+def test_broadcaster_fans_out_and_drops_slow_subscribers(client):
+    """Test every subscriber gets each message and a full queue is disconnected"""
+    hub = Broadcaster(queue_size=2)
+    hub._thread = type('Running', (), {'is_alive': lambda self: True})()
+    fast, slow = hub.subscribe(client.application), hub.subscribe(client.application)
+
+    hub.publish(1, 'one')
+    assert fast.get_nowait() == (1, 'one')
+    hub.publish(2, 'two')
+    hub.publish(3, 'three')
+    assert hub.subscriber_count == 1
+    assert [slow.get_nowait(), slow.get_nowait()] == [(2, 'two'), None]
+    assert [fast.get_nowait(), fast.get_nowait()] == [(2, 'two'), (3, 'three')]
+
+def test_event_stream_replays_and_pushes_changes(client, inventory, manual_broadcaster):
+    """Test the stream replays from Last-Event-ID then pushes new transitions"""
+    app = inventory({'TestApp': [('host0', 80), ('host1', 80)]})['TestApp']
+    instance_ids = sorted(i.id for i in app.instances)
+    version = client.get('/api/changes').get_json()['version']
+    with SQLStatusSink(db.session, ApplicationInstance) as sink:
+        sink.add(instance_ids[0], {'status': 'up'})
+
+    response = client.get('/api/events', headers={'Last-Event-ID': str(version)})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    stream = iter(response.response)
+    retry, replayed = _read(stream, 2)
+    assert retry.startswith('retry: ')
+    assert replayed.startswith(f'id: {version + 1}\nevent: changes\ndata: ')
+    assert f'"id":{instance_ids[0]},"status":"up"' in replayed
+
+    with SQLStatusSink(db.session, ApplicationInstance) as sink:
+        sink.add(instance_ids[1], {'status': 'down'})
+    manual_broadcaster.poll()
+    [pushed] = _read(stream, 1)
+    assert pushed.startswith(f'id: {version + 2}\n')
+    assert f'"id":{instance_ids[1]},"status":"down"' in pushed
+
+    response.close()
+    assert manual_broadcaster.subscriber_count == 0
+    assert client.get('/api/events?since=x').status_code == 400
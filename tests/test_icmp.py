@@ -0,0 +1,45 @@
+import time
+import socket
+import struct
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.icmp import IcmpSweeper, IcmpUnavailable, PingBatcher, checksum, echo_request
+
+def test_echo_request_checksum():
+    """Test echo requests carry a checksum that verifies to zero"""
+    packet = echo_request(socket.AF_INET, 0x1234, 7, b'token!!!')
+    assert struct.unpack('!BBHHH', packet[:8])[0] == 8
+    assert struct.unpack('!HH', packet[4:8]) == (0x1234, 7)
+    assert checksum(packet) == 0
+    assert checksum(b'\x08\x00\x00\x00\x00\x01\x00\x01') == 0xF7FD
+
+def test_sweep_pings_many_hosts_in_one_window():
+    """Test a /22 of loopback addresses is swept in about one timeout, without subprocesses"""
+    hosts = [f'127.0.{i // 256}.{i % 256}' for i in range(1, 1024)] + ['no-such-host.invalid']
+    sweeper = IcmpSweeper(timeout=0.5)
+    started = time.monotonic()
+    try:
+        results = sweeper.sweep(hosts)
+    except IcmpUnavailable:
+        pytest.skip('ICMP sockets are not permitted here')
+    assert time.monotonic() - started < 1.5
+    assert set(results) == set(hosts)
+    assert results['no-such-host.invalid'] is None
+    assert results['127.0.0.1'] is not None
+    assert sum(rtt is not None for rtt in results.values()) >= 1000
+
+def test_batcher_coalesces_concurrent_pings():
+    """Test pings from many threads within the window go out as one sweep"""
+    swept = []
+
+    class Sweeper:
+        def sweep(self, hosts):
+            swept.append(sorted(hosts))
+            return {host: 0.001 for host in hosts if host != 'down'}
+
+    batcher = PingBatcher(Sweeper(), window=0.05)
+    hosts = ['a', 'b', 'c', 'a', 'down'] * 4
+    with ThreadPoolExecutor(len(hosts)) as pool:
+        results = list(pool.map(batcher.ping, hosts))
+    assert swept == [['a', 'b', 'c', 'down']]
+    assert results[:5] == [0.001, 0.001, 0.001, 0.001, None]
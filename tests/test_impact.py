@@ -0,0 +1,69 @@
+import csv
+import os
+import time
+from app import db
+from app.models import Application, ApplicationInstance, ApplicationDependency
+from app.importer import import_csv
+from app.impact import HOSTS, impact, host_key
+from app.versioning import current_version
+
+def _import_large():
+    with open(os.path.join(os.path.dirname(__file__), '..', 'large_test.csv'), newline='') as f:
+        import_csv(csv.DictReader(f))
+    return dict(db.session.query(Application.name, Application.id))
+
+def _names(entries):
+    return [entry['name'] for entry in entries]
+
+def test_host_impact_follows_dependency_chain(client):
+    """Test a database host reaches its users and everything that depends on them"""
+    ids = _import_large()
+    data = client.get('/api/impact?host=DB1.example.com').get_json()
+    assert _names(data['sources']) == ['Backend API 1', 'Database 1']
+    assert _names(data['impacted']) == ['Frontend Service 1']
+
+    data = client.get(f"/api/impact?app={ids['Database 1']}").get_json()
+    assert sorted(_names(data['impacted'])) == ['Backend API 1', 'Frontend Service 1']
+    assert data['count'] == 2
+
+    assert client.get('/api/impact?host=nowhere').get_json()['count'] == 0
+    assert client.get('/api/impact').status_code == 400
+    assert client.get('/api/impact?app=x').status_code == 400
+    assert client.get('/api/impact?app=999999').status_code == 404
+
+def test_impact_lookups_are_cached(client):
+    """Test repeated lookups are served from the closure and host caches"""
+    ids = _import_large()
+    impact(host='db500.example.com')
+    started = time.perf_counter()
+    for _ in range(1000):
+        sources, impacted = impact(app_id=ids['Database 500'])
+    assert (time.perf_counter() - started) / 1000 < 0.001
+    assert impacted == {ids['Backend API 500'], ids['Frontend Service 500']}
+
+def test_impact_follows_inventory_changes(client, inventory):
+    """Test new dependencies and moved databases show up, while status updates leave the host index alone"""
+    apps = inventory({'Api': [('api1', 80)], 'Db': [('db1', 5432)], 'Reports': [('rep1', 80)]})
+    apps['Api'].instances[0].db_host = 'db1:5432'
+    db.session.add(ApplicationDependency(application=apps['Api'], owner=apps['Db']))
+    db.session.commit()
+    assert impact(host='db1') == ({apps['Api'].id, apps['Db'].id}, set())
+    assert impact(app_id=apps['Db'].id)[1] == {apps['Api'].id}
+
+    db.session.add(ApplicationDependency(application=apps['Reports'], owner=apps['Api']))
+    apps['Reports'].instances.append(ApplicationInstance(host='rep2', db_host='db1'))
+    db.session.commit()
+    assert impact(app_id=apps['Db'].id)[1] == {apps['Api'].id, apps['Reports'].id}
+    assert impact(host='db1')[0] == {apps['Api'].id, apps['Db'].id, apps['Reports'].id}
+
+    version = current_version(HOSTS)
+    apps['Db'].instances[0].status = 'down'
+    db.session.commit()
+    assert current_version(HOSTS) == version
+
+def test_host_key():
+    """Test db_host values with ports and IPv6 hosts normalise to the bare host"""
+    assert host_key(' DB1.Example.com:5432 ') == 'db1.example.com'
+    assert host_key('[::1]:5432') == '::1'
+    assert host_key('fe80::1') == 'fe80::1'
+    assert host_key('') is None
@@ -0,0 +1,169 @@
+import csv
+import io
+import random
+import time
+import sqlalchemy
+from app import db
+from app.models import Team, Application, ApplicationDependency
+from app.importer import import_csv
+from app.planner import DependencyGraph, PLAN, build_plan, load_graph, plan_cache, plan_for, shutdown_plan
+from app.versioning import bump_version
+from app.utils import get_shutdown_sequence
+
+INVENTORY = """name,team,host,port,shutdown_order,dependencies
+Frontend,Web,web1,80,100,
+Backend,API,api1,3000,90,Frontend
+Worker,API,worker1,,95,Frontend
+Database,Data,db1,5432,10,Backend;Worker;Missing
+"""
+
+def _import(content=INVENTORY, **kwargs):
+    return import_csv(csv.DictReader(io.StringIO(content)), **kwargs)
+
+def test_build_plan_groups_waves():
+    """Test waves respect edges, with higher shutdown_order first inside a wave"""
+    plan = build_plan({1: 10, 2: 50, 3: None, 4: 20}, [(1, 4), (2, 4), (4, 3), (9, 1)])
+    assert plan.waves == [[2, 1], [4], [3]]
+    assert plan.order == [2, 1, 4, 3]
+    assert plan.cycles == []
+    assert plan.critical_path == [1, 4, 3]
+
+def test_build_plan_reports_cycles():
+    """Test applications in a cycle are reported rather than dropped silently"""
+    plan = build_plan(dict.fromkeys(range(1, 6)), [(1, 2), (2, 3), (3, 2), (3, 4), (5, 5)])
+    assert plan.waves == [[1, 5]]
+    assert plan.cycles == [[2, 3]]
+
+def test_build_plan_handles_deep_chains():
+    """Test a long chain is planned without recursion and in linear time"""
+    nodes = dict.fromkeys(range(30000), 0)
+    started = time.perf_counter()
+    plan = build_plan(nodes, [(i, i + 1) for i in range(29999)])
+    assert time.perf_counter() - started < 2
+    assert len(plan.waves) == 30000
+    assert plan.critical_path[0] == 0 and plan.critical_path[-1] == 29999
+
+def test_import_writes_dependencies(client):
+    """Test the dependencies column becomes edges and drives the shutdown plan"""
+    stats = _import()
+    assert stats.imported == 4
+    assert any("Unknown dependency 'Missing'" in warning for warning in stats.errors)
+    assert ApplicationDependency.query.count() == 4
+
+    ids = dict(db.session.query(Application.name, Application.id))
+    plan = client.get('/api/shutdown_plan').get_json()
+    assert [[app['name'] for app in wave] for wave in plan['waves']] == [
+        ['Frontend'], ['Worker', 'Backend'], ['Database']]
+    assert plan['cycles'] == []
+
+    database = db.session.get(Application, ids['Database'])
+    assert [app.name for app in get_shutdown_sequence(database)] == ['Frontend', 'Worker', 'Backend', 'Database']
+    backend = db.session.get(Application, ids['Backend'])
+    assert [app.name for app in get_shutdown_sequence(backend)] == ['Frontend', 'Backend']
+
+def test_sync_drops_orphaned_dependencies(client):
+    """Test syncing away an application removes the edges pointing at it"""
+    _import()
+    stats = _import('name,team,host,port,dependencies\nFrontend,Web,web1,80,\nBackend,API,api1,3000,Frontend\n',
+                    mode='sync')
+    assert stats.imported == 2
+    ids = dict(db.session.query(Application.name, Application.id))
+    assert set(ids) == {'Frontend', 'Backend'}
+    assert db.session.query(ApplicationDependency.dependency_id, ApplicationDependency.application_id).all() == [
+        (ids['Frontend'], ids['Backend'])]
+
+def test_relevel_matches_full_rebuild():
+    """Test incremental re-levelling after random edits gives the same plan as starting over"""
+    rng = random.Random(7)
+    nodes = {i: rng.choice([None, 10, 50, 90]) for i in range(200)}
+    edges = {tuple(sorted(rng.sample(range(200), 2))) for _ in range(600)}
+    graph = DependencyGraph()
+    for app_id, order in nodes.items():
+        graph.add_node(app_id, order)
+    for before, after in edges:
+        graph.add_edge(before, after)
+    graph.relevel()
+
+    blocked_seen = False
+    for _ in range(100):
+        app_id = rng.randrange(200)
+        seeds = graph.remove_node(app_id) | {app_id}
+        edges = {edge for edge in edges if app_id not in edge}
+        if rng.random() < 0.8:
+            nodes[app_id] = rng.choice([None, 10, 50, 90])
+            graph.add_node(app_id, nodes[app_id])
+            for _ in range(rng.randrange(1, 5)):
+                edge = rng.choice([(app_id, rng.randrange(200)), (rng.randrange(200), app_id)])
+                if edge[0] in nodes and edge[1] in nodes:
+                    edges.add(edge)
+                    graph.add_edge(*edge)
+        else:
+            nodes.pop(app_id, None)
+        graph.relevel(seeds)
+
+        expected, actual = build_plan(nodes, edges), graph.plan()
+        assert actual.waves == expected.waves
+        assert actual.blocked == expected.blocked
+        assert actual.cycles == expected.cycles
+        assert actual.critical_path == expected.critical_path
+        blocked_seen = blocked_seen or bool(expected.blocked)
+    # The random edits must have closed and broken cycles along the way
+    assert blocked_seen
+
+def test_plan_cache_updates_incrementally(client):
+    """Test ORM edits re-level only what they touched, and other writes rebuild"""
+    _import()
+    plan = shutdown_plan()
+    assert shutdown_plan() is plan
+    rebuilds, updates = plan_cache.rebuilds, plan_cache.updates
+    ids = dict(db.session.query(Application.name, Application.id))
+
+    # Worker no longer waits for Frontend, and sorts ahead of it in the first wave
+    worker = db.session.get(Application, ids['Worker'])
+    worker.shutdown_order = 200
+    db.session.delete(ApplicationDependency.query.filter_by(application_id=ids['Worker']).one())
+    db.session.commit()
+    assert shutdown_plan().waves == [[ids['Worker'], ids['Frontend']], [ids['Backend']], [ids['Database']]]
+
+    team, database = Team.query.first(), db.session.get(Application, ids['Database'])
+    cache = Application(name='Cache', team_ref=team, shutdown_order=5)
+    cache.dependencies = [ApplicationDependency(application=database)]
+    db.session.add(cache)
+    db.session.commit()
+    assert shutdown_plan().order[-1] == cache.id
+    assert plan_for([ids['Backend']]).waves == [[ids['Frontend']], [ids['Backend']]]
+
+    db.session.delete(db.session.get(Application, ids['Backend']))
+    db.session.commit()
+    assert shutdown_plan().waves == [[ids['Worker'], ids['Frontend']], [ids['Database']], [cache.id]]
+    assert plan_cache.rebuilds == rebuilds and plan_cache.updates == updates + 3
+
+    # A write that bypasses the session hooks, as another process would, rebuilds once
+    db.session.execute(sqlalchemy.update(Application).values(shutdown_order=1))
+    bump_version(PLAN)
+    db.session.commit()
+    assert shutdown_plan().waves[0] == [ids['Frontend'], ids['Worker']]
+    assert plan_cache.rebuilds == rebuilds + 1
+
+def test_plan_cache_ignores_notes_it_has_already_rebuilt_past(client, monkeypatch):
+    """Test a commit noted after a reader rebuilt cannot vouch for a later write from elsewhere"""
+    _import()
+    shutdown_plan()
+    ids = dict(db.session.query(Application.name, Application.id))
+
+    # A reader rebuilds between this commit publishing its version and noting it
+    notes = []
+    monkeypatch.setattr(plan_cache, 'note', notes.append)
+    db.session.get(Application, ids['Frontend']).shutdown_order = 300
+    db.session.commit()
+    shutdown_plan()
+    monkeypatch.undo()
+    plan_cache.note(*notes)
+
+    # One bump from another process, which reports nothing
+    db.session.execute(sqlalchemy.update(Application).where(Application.id == ids['Worker'])
+                       .values(shutdown_order=1))
+    bump_version(PLAN)
+    db.session.commit()
+    assert shutdown_plan().waves[1] == [ids['Backend'], ids['Worker']]
+    assert shutdown_plan().to_dict() == build_plan(*load_graph()).to_dict()
@@ -0,0 +1,82 @@
+import asyncio
+import socket
+import time
+from app.probe import ProbeEngine, rollup_status
+
+def _closed_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def test_probe_engine_up_and_down():
+    """Test the engine reports open and closed ports in target order"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    open_port = listener.getsockname()[1]
+    closed_port = _closed_port()
+
+    try:
+        results = ProbeEngine(timeout=1).run([
+            ('127.0.0.1', open_port),
+            ('127.0.0.1', closed_port),
+            ('127.0.0.1', 'not-a-port'),
+        ])
+    finally:
+        listener.close()
+
+    assert results[0] == (True, None)
+    assert results[1][0] is False
+    assert results[2][0] is False
+
+def test_probe_engine_runs_concurrently():
+    """Test a sweep of many dead targets takes about one timeout, not the sum"""
+    # 192.0.2.0/24 is TEST-NET-1 and never routed, so connects hang until timeout
+    targets = [(f'192.0.2.{i}', 80) for i in range(1, 201)]
+    started = time.monotonic()
+    results = ProbeEngine(concurrency=500, timeout=0.5).run(targets)
+    elapsed = time.monotonic() - started
+
+    assert len(results) == 200
+    assert not any(is_up for is_up, _ in results)
+    assert elapsed < 5
+
+def test_busy_host_does_not_starve_others():
+    """Test probes queued on one slow host leave global slots free for healthy hosts"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('', 0))
+    listener.listen(64)
+    port = listener.getsockname()[1]
+    engine = ProbeEngine(concurrency=10, per_host=2, timeout=0.5)
+
+    async def sweep():
+        slow = [asyncio.ensure_future(engine.probe('192.0.2.1', 80)) for _ in range(40)]
+        started = time.monotonic()
+        healthy = await asyncio.gather(*(engine.probe(f'127.0.0.{i}', port) for i in range(1, 6)))
+        elapsed = time.monotonic() - started
+        for task in slow:
+            task.cancel()
+        await asyncio.gather(*slow, return_exceptions=True)
+        return healthy, elapsed
+
+    try:
+        healthy, elapsed = asyncio.run(sweep())
+    finally:
+        listener.close()
+    assert healthy == [(True, None)] * 5
+    assert elapsed < 1
+    # Host semaphores are dropped once no probe uses them
+    assert engine._host_limits == {}
+
+def test_probe_reports_resolution_failures():
+    """Test a name that does not resolve is reported as a resolution failure"""
+    engine = ProbeEngine(timeout=0.5)
+    assert engine.run([('no-such-host.invalid', 80)]) == [(False, 'Name resolution failed')]
+    assert engine._host_limits == {}
+
+def test_rollup_status():
+    assert rollup_status(3, 0) == 'UP'
+    assert rollup_status(3, 1) == 'PARTIAL'
+    assert rollup_status(3, 3) == 'DOWN'
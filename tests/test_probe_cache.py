@@ -0,0 +1,90 @@
+import time
+from threading import Barrier, Thread
+import pytest
+from app import probe_cache as cache_module
+from app import db
+from app.models import ApplicationInstance, System
+from app.probe_cache import ProbeCache
+
+def test_cache_serves_fresh_results_and_reprobes_stale_ones():
+    """Test results are reused within the TTL and probed again after it"""
+    cache = ProbeCache(ttl=0.2)
+    calls = []
+    probe = lambda: calls.append(1) or (True, [])
+
+    first = cache.get(('host', 'a', 80), probe)
+    assert cache.get(('host', 'a', 80), probe) == first
+    assert len(calls) == 1
+    time.sleep(0.25)
+    cache.get(('host', 'a', 80), probe)
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_cache_evicts_least_recently_used():
+    cache = ProbeCache(maxsize=2)
+    cache.get('a', lambda: 'a')
+    cache.get('b', lambda: 'b')
+    cache.get('a', lambda: 'unused')  # touch a so b is the oldest
+    cache.get('c', lambda: 'c')
+    assert len(cache) == 2
+    assert cache.get('a', lambda: 'reprobed')[0] == 'a'
+    assert cache.get('b', lambda: 'reprobed')[0] == 'reprobed'
+
+def test_cache_coalesces_concurrent_probes():
+    """Test many concurrent lookups of one key run a single probe"""
+    cache = ProbeCache()
+    calls = []
+    barrier = Barrier(10)
+
+    def probe():
+        calls.append(1)
+        time.sleep(0.2)
+        return (False, ['down'])
+
+    results = []
+    def lookup():
+        barrier.wait()
+        results.append(cache.get(('host', 'b', 22), probe))
+
+    threads = [Thread(target=lookup) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 10
+    assert all(result == results[0] for result in results)
+    assert results[0][0] == (False, ['down'])
+
+def test_cache_does_not_keep_failures():
+    cache = ProbeCache()
+    with pytest.raises(OSError):
+        cache.get('c', lambda: (_ for _ in ()).throw(OSError('boom')))
+    assert cache.get('c', lambda: 'ok')[0] == 'ok'
+
+def test_check_status_reuses_cached_probes(client, inventory, monkeypatch):
+    """Test repeated UI checks of one application probe each host once"""
+    app = inventory({'TestApp': [('h1', 80), ('h2', 80)]})['TestApp']
+
+    calls = []
+    monkeypatch.setattr(cache_module, 'probe_cache', ProbeCache())
+    monkeypatch.setattr(cache_module, 'check_host_status',
+                        lambda host, port: calls.append(host) or (host == 'h1', [f'{host} checked']))
+    for _ in range(3):
+        data = client.get(f'/check_status/{app.id}').get_json()
+    assert sorted(calls) == ['h1', 'h2']
+    assert data['app_status'] == 'PARTIAL'
+    assert {r['host']: r['status'] for r in data['results']} == {'h1': 'UP', 'h2': 'DOWN'}
+    assert {i.host: i.status for i in ApplicationInstance.query} == {'h1': 'up', 'h2': 'down'}
+    instance_id = data['results'][0]['instance_id']
+    assert client.get(f'/check_instance_status/{instance_id}').get_json()['instance_status'] == 'UP'
+    assert len(calls) == 2
+
+def test_check_all_status_saves_system_statuses(client, monkeypatch):
+    """Test system checks are saved as running/stopped, the values the systems page shows"""
+    db.session.add_all([System(name='Up', host='s1', port=80), System(name='Down', host='s2', port=80)])
+    db.session.commit()
+    monkeypatch.setattr(cache_module, 'probe_cache', ProbeCache())
+    monkeypatch.setattr(cache_module, 'check_host_status', lambda host, port: (host == 's1', []))
+    assert client.get('/check_all_status').get_json() == {'status': 'success', 'checked': 2}
+    assert {s.name: s.status for s in System.query} == {'Up': 'running', 'Down': 'stopped'}
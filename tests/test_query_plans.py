@@ -0,0 +1,29 @@
+import pytest
+from app import db
+from app.models import Team, Application, ApplicationInstance
+
+def _plan(query):
+    sql = str(query.statement.compile(db.get_engine(), compile_kwargs={'literal_binds': True}))
+    return ' | '.join(row[-1] for row in db.session.execute(f'EXPLAIN QUERY PLAN {sql}'))
+
+@pytest.mark.parametrize('build, index', [
+    (lambda: Team.query.filter_by(name='Web Team'), 'ix_teams_name'),
+    (lambda: Application.query.filter_by(name='Web'), 'ix_applications_name'),
+    (lambda: Application.query.filter_by(team_id=1), 'ix_applications_team_id'),
+    (lambda: ApplicationInstance.query.filter_by(application_id=1),
+        'ix_application_instances_application_id_status'),
+    (lambda: ApplicationInstance.query.filter_by(application_id=1, status='up'),
+        'ix_application_instances_application_id_status'),
+    (lambda: ApplicationInstance.query.filter_by(status='down'), 'ix_application_instances_status'),
+    (lambda: ApplicationInstance.query.filter_by(host='web1'), 'ix_application_instances_host'),
+])
+def test_hot_lookups_use_indexes(client, build, index):
+    """Test hot lookups search an index instead of scanning the table"""
+    plan = _plan(build())
+    assert f'USING INDEX {index}' in plan or f'USING COVERING INDEX {index}' in plan, plan
+
+def test_team_names_are_unique(client):
+    rv = client.post('/api/teams', json={'name': 'Web Team'})
+    assert rv.status_code == 200
+    rv = client.post('/api/teams', json={'name': 'Web Team'})
+    assert rv.status_code == 409
@@ -0,0 +1,68 @@
+from io import BytesIO
+from app import db
+from app.models import Team, ApplicationInstance, ApplicationStatusRollup
+from app.rollups import refresh_rollups
+from app.status_sink import SQLStatusSink
+
+def _counts():
+    return {row.application_id: (row.up, row.down, row.unknown) for row in ApplicationStatusRollup.query}
+
+def _recounted():
+    """What a full rebuild produces, to compare the incremental result against"""
+    before = _counts()
+    refresh_rollups()
+    after = _counts()
+    db.session.rollback()
+    return before, after
+
+def test_rollups_follow_status_changes(client, inventory):
+    """Test sink batches and ORM updates adjust the counters incrementally"""
+    apps = inventory({'Web': [('web1', 80), ('web2', 80)], 'Db': [('db1', 5432)]})
+    web, dbapp = apps['Web'], apps['Db']
+    assert _counts() == {web.id: (0, 0, 2), dbapp.id: (0, 0, 1)}
+
+    web_ids = sorted(i.id for i in web.instances)
+    with SQLStatusSink(db.session, ApplicationInstance) as sink:
+        sink.add(web_ids[0], {'status': 'up'})
+        sink.add(web_ids[1], {'status': 'down'})
+        sink.add(web_ids[1], {'status': 'up'})
+    assert _counts()[web.id] == (2, 0, 0)
+
+    dbapp.instances[0].status = 'down'
+    db.session.commit()
+    assert _counts()[dbapp.id] == (0, 1, 0)
+
+    teams = client.get('/api/status/teams').get_json()
+    assert teams == [{'id': web.team_id, 'name': 'Test Team', 'applications': 2,
+                      'up': 2, 'down': 1, 'unknown': 0, 'status': 'PARTIAL'}]
+    rollups = client.get(f'/api/status/applications?team={web.team_id}').get_json()
+    assert {r['name']: r['status'] for r in rollups} == {'Web': 'UP', 'Db': 'DOWN'}
+
+    before, after = _recounted()
+    assert before == after
+
+def test_rollups_follow_inventory_changes(client, inventory):
+    """Test added, removed and moved instances and applications are recounted"""
+    apps = inventory({'Web': [('web1', 80)], 'Db': [('db1', 5432)]})
+    web, dbapp = apps['Web'], apps['Db']
+
+    web.instances.append(ApplicationInstance(host='web2', port=80, status='up'))
+    db.session.delete(dbapp)
+    other = Team(name='Other Team')
+    web.team_ref = other
+    db.session.commit()
+
+    assert _counts() == {web.id: (1, 0, 1)}
+    teams = {t['name']: t for t in client.get('/api/status/teams').get_json()}
+    assert teams['Other Team']['applications'] == 1 and teams['Other Team']['up'] == 1
+    assert teams['Test Team']['applications'] == 0 and teams['Test Team']['status'] == 'UNKNOWN'
+    assert client.get('/api/status/applications?team=x').status_code == 400
+
+def test_rollups_rebuilt_after_import(client):
+    """Test bulk imports, which skip the flush hooks, still leave correct rollups"""
+    csv = 'name,team,host,port\nWeb,Ops,web1,80\nWeb,Ops,web2,80\nDb,Data,db1,5432\n'
+    rv = client.post('/import_apps', data={'file': (BytesIO(csv.encode()), 'apps.csv')},
+                     content_type='multipart/form-data')
+    assert rv.status_code == 200
+    rollups = {r['name']: (r['unknown'], r['status']) for r in client.get('/api/status/applications').get_json()}
+    assert rollups == {'Web': (2, 'UNKNOWN'), 'Db': (1, 'UNKNOWN')}
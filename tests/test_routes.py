@@ -1,20 +1,16 @@
+import io
 import os
+import csv
+import time
 import pytest
 import tempfile
-from app import create_app, db
-from app.models import Application, Team, ApplicationInstance
-
-@pytest.fixture
-def client():
-    app = create_app()
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    
-    with app.test_client() as client:
-        with app.app_context():
-            db.create_all()
-            yield client
-            db.drop_all()
+from datetime import datetime
+from threading import Event
+from concurrent.futures import ProcessPoolExecutor
+from app import db
+from app.models import Application, Team, ApplicationInstance, System, application_systems
+from app.importer import import_csv, import_csv_parallel
+from app.jobs import Job, JobCancelled, JobManager
 
 def test_index(client):
     """Test the index page loads"""
@@ -172,3 +168,331 @@ def test_shutdown_app(client):
     # Verify instance status
     instance = ApplicationInstance.query.get(instance.id)
     assert instance.status == 'in_progress'
+
+def _upload(client, path, url='/import_apps', **form):
+    with open(path, 'rb') as f:
+        return client.post(url,
+                           data=dict(form, file=(f, os.path.basename(path))),
+                           content_type='multipart/form-data')
+
+def test_import_groups_instances(client):
+    """Test rows sharing an application name become instances of one application"""
+    rv = _upload(client, os.path.join(os.path.dirname(__file__), '..', 'test_grouping.csv'))
+    assert rv.status_code == 200
+    assert rv.get_json()['imported'] == 5
+
+    assert Team.query.count() == 3
+    assert Application.query.count() == 3
+    frontend = Application.query.filter_by(name='Frontend App').first()
+    assert frontend.team.name == 'Web Team'
+    assert sorted(i.host for i in frontend.instances) == ['web1.example.com', 'web2.example.com']
+
+def test_import_large_file_is_batched(client, statements):
+    """Test a 3,000 row import issues a bounded number of statements"""
+    rv = _upload(client, os.path.join(os.path.dirname(__file__), '..', 'large_test.csv'))
+    count = len(statements)
+
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert data['imported'] == 3000
+    assert data['rows_per_second'] > 0
+    assert ApplicationInstance.query.count() == 3000
+    assert count < 50
+
+def test_preview_csv(client):
+    """Test preview decodes only the first rows of the upload"""
+    rv = _upload(client, os.path.join(os.path.dirname(__file__), '..', 'large_test.csv'), url='/preview_csv')
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert data['headers'][:3] == ['name', 'team', 'host']
+    assert len(data['preview']) == 5
+    assert data['preview'][0]['name'] == 'Frontend Service 1'
+
+def _upload_text(client, content, **form):
+    return client.post('/import_apps',
+                       data=dict(form, file=(io.BytesIO(content.encode()), 'inventory.csv')),
+                       content_type='multipart/form-data')
+
+def test_import_sync_mode_applies_diff(client):
+    """Test sync mode only touches rows that changed"""
+    header = 'name,team,host,port,db_host\n'
+    rv = _upload_text(client, header +
+                      'Web,Web Team,web1,80,\n'
+                      'Web,Web Team,web2,80,\n'
+                      'Api,API Team,api1,3000,db1:5432\n'
+                      'Legacy,Old Team,old1,22,\n')
+    assert rv.status_code == 200
+
+    web1 = ApplicationInstance.query.filter_by(host='web1').first()
+    web1.status = 'up'
+    db.session.commit()
+    web1_id = web1.id
+
+    rv = _upload_text(client, header +
+                      'Web,Web Team,web1,80,\n'
+                      'Web,Web Team,web3,80,\n'
+                      'Api,Platform Team,api1,3000,db2:5432\n'
+                      'Api,Platform Team,api1,3000,db2:5432\n', mode='sync')
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert (data['inserted'], data['updated'], data['deleted'], data['unchanged']) == (1, 1, 2, 1)
+    assert data['skipped'] == 1
+
+    web1 = ApplicationInstance.query.get(web1_id)
+    assert web1.status == 'up'
+    assert sorted(i.host for i in ApplicationInstance.query) == ['api1', 'web1', 'web3']
+    assert ApplicationInstance.query.filter_by(host='api1').first().db_host == 'db2:5432'
+    assert Application.query.filter_by(name='Api').first().team.name == 'Platform Team'
+    assert Application.query.filter_by(name='Legacy').first() is None
+
+def _link_system(app_name):
+    system = System(name='Rack 1', host='rack1')
+    app = Application.query.filter_by(name=app_name).one()
+    app.systems.append(system)
+    db.session.commit()
+    return system.id
+
+def _system_links():
+    return db.session.execute(db.select(application_systems.c.application_id)).scalars().all()
+
+def test_replace_import_drops_system_links(client):
+    """Test a replace import removes the system links of the applications it deletes"""
+    _upload_text(client, 'name,team,host\nWeb,Web Team,web1\n')
+    system_id = _link_system('Web')
+    assert len(_system_links()) == 1
+
+    rv = _upload_text(client, 'name,team,host\nWeb,Web Team,web1\n')
+    assert rv.status_code == 200
+    assert _system_links() == []
+    assert db.session.get(System, system_id) is not None
+
+def test_sync_import_drops_system_links_of_orphans(client):
+    """Test sync mode removes the system links of applications it deletes, and keeps the others"""
+    _upload_text(client, 'name,team,host\nWeb,Web Team,web1\nLegacy,Old Team,old1\n')
+    _link_system('Web')
+    _link_system('Legacy')
+
+    rv = _upload_text(client, 'name,team,host\nWeb,Web Team,web1\n', mode='sync')
+    assert rv.status_code == 200
+    assert _system_links() == [Application.query.filter_by(name='Web').one().id]
+
+def test_import_rejects_unknown_mode(client):
+    rv = _upload_text(client, 'name,team,host\nWeb,Web Team,web1\n', mode='merge')
+    assert rv.status_code == 400
+
+def test_import_parallel_matches_serial(client, monkeypatch):
+    """Test the process pool import keeps per-row errors and file order"""
+    monkeypatch.setattr('app.importer.IMPORT_CHUNK_BYTES', 64)
+    lines = ['name,team,host,port']
+    for i in range(1, 41):
+        lines.append(f'App {i},Team {i % 3},host{i},{"bad" if i == 17 else 8000 + i}')
+    lines.insert(30, '')
+    lines.append('App 41,Team 1,,80')
+    content = '\n'.join(lines) + '\n'
+
+    serial = _upload_text(client, content).get_json()
+    serial_hosts = [(i.application.name, i.host) for i in ApplicationInstance.query.order_by('id')]
+    parallel = _upload_text(client, content, parallel='1').get_json()
+    parallel_hosts = [(i.application.name, i.host) for i in ApplicationInstance.query.order_by('id')]
+
+    assert parallel['imported'] == serial['imported'] == 39
+    assert parallel['errors'] == serial['errors'] == [
+        "Row 18: Invalid value - port 'bad' is not a number",
+        'Row 42: Missing values for host'
+    ]
+    assert parallel_hosts == serial_hosts
+
+def _wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/import_jobs/{job_id}').get_json()
+        if job['state'] in ('completed', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
+
+def test_import_parallel_bounds_work_in_flight(client, monkeypatch, tmp_path):
+    """Test the pool is fed a bounded window of ranges and an aborted import stops feeding it"""
+    submitted = []
+    class RecordingPool(ProcessPoolExecutor):
+        def submit(self, *args, **kwargs):
+            submitted.append(args[2])
+            return super().submit(*args, **kwargs)
+    monkeypatch.setattr('app.importer.ProcessPoolExecutor', RecordingPool)
+    monkeypatch.setattr('app.importer.IMPORT_INFLIGHT_PER_WORKER', 2)
+    path = tmp_path / 'inventory.csv'
+    path.write_text('name,team,host\n' + ''.join(f'App {i},Team,host{i}\n' for i in range(2000)))
+
+    def cancel(stats):
+        raise JobCancelled()
+    with pytest.raises(JobCancelled):
+        import_csv_parallel(str(path), workers=1, chunk_bytes=1024, batch_size=10, progress=cancel)
+    # The window of two, plus the range submitted once the first was handed over
+    assert len(submitted) == 3
+    assert ApplicationInstance.query.count() == 0
+
+def test_import_job_reports_progress(client):
+    """Test an import submitted as a background job"""
+    with open(os.path.join(os.path.dirname(__file__), '..', 'large_test.csv'), 'rb') as f:
+        rv = client.post('/api/import_jobs', data={'file': (f, 'large_test.csv')},
+                         content_type='multipart/form-data')
+    assert rv.status_code == 202
+    job_id = rv.get_json()['job_id']
+
+    job = _wait_for_job(client, job_id)
+    assert job['state'] == 'completed'
+    assert job['progress']['rows'] == 3000
+    assert job['result']['imported'] == 3000
+    assert ApplicationInstance.query.count() == 3000
+
+    assert client.get('/api/import_jobs/missing').status_code == 404
+
+def test_import_job_cancel(client):
+    """Test a cancelled job rolls back instead of committing"""
+    job = Job('import')
+    job.cancel()
+    reader = csv.DictReader(io.StringIO('name,team,host\n' + 'App,Team,host\n' * 5))
+    with pytest.raises(JobCancelled):
+        import_csv(reader, batch_size=2, progress=lambda stats: job.update(rows=stats.rows))
+    assert Application.query.count() == 0
+
+def test_job_cancelled_while_queued_runs_cleanup():
+    """Test a job cancelled before it starts still releases its resources"""
+    manager = JobManager(workers=1)
+    release = Event()
+    cleaned = []
+    blocker = manager.submit('import', lambda job: release.wait(5))
+    queued = manager.submit('import', lambda job: 'ran', cleanup=lambda: cleaned.append('queued'))
+    queued.cancel()
+    release.set()
+    manager._executor.shutdown(wait=True)
+    assert blocker.state == 'completed'
+    assert queued.state == 'cancelled' and queued.result is None
+    assert cleaned == ['queued']
+    progress = queued.to_dict()['progress']
+    queued.progress['rows'] = 1
+    assert progress == {}
+
+def _add_applications(count, start=0):
+    team = Team.query.filter_by(name='Test Team').first() or Team(name='Test Team')
+    for i in range(start, start + count):
+        app = Application(name=f'App {i}', team_ref=team)
+        app.systems.append(System(name=f'System {i}', host=f'host{i}', port=80))
+        db.session.add(app)
+    db.session.commit()
+    db.session.expunge_all()
+
+def test_list_applications_query_count_is_constant(client, statements):
+    """Test listing applications costs the same number of queries for 3 or 30 apps"""
+    _add_applications(3)
+    statements.clear()
+    rv = client.get('/api/applications')
+    assert rv.status_code == 200
+    few = len(statements)
+
+    _add_applications(27, start=3)
+    statements.clear()
+    rv = client.get('/api/applications')
+    data = rv.get_json()
+    assert len(data) == 30
+    assert data[0]['team_name'] == 'Test Team'
+    assert data[0]['systems'][0]['host'] == 'host0'
+    assert len(statements) == few <= 3  # version check, applications, systems
+
+def test_list_applications_pagination(client):
+    """Test keyset pagination, projection and filters on the list endpoint"""
+    _add_applications(5)
+    other = Team(name='Other Team')
+    db.session.add(Application(name='Other App', team_ref=other, state='completed'))
+    db.session.commit()
+
+    rv = client.get('/api/applications?limit=2&fields=name,team_name')
+    page = rv.get_json()
+    assert [app['name'] for app in page] == ['App 0', 'App 1']
+    assert set(page[0]) == {'id', 'name', 'team_name'}
+    after = rv.headers['X-Next-After']
+    assert f'after={after}' in rv.headers['Link']
+
+    names = []
+    while after:
+        rv = client.get(f'/api/applications?limit=2&fields=name&after={after}')
+        names += [app['name'] for app in rv.get_json()]
+        after = rv.headers.get('X-Next-After')
+    assert names == ['App 2', 'App 3', 'App 4', 'Other App']
+
+    assert [a['name'] for a in client.get('/api/applications?team=Other Team').get_json()] == ['Other App']
+    assert len(client.get('/api/applications?state=completed').get_json()) == 1
+
+    app = Application.query.filter_by(name='App 3').first()
+    db.session.add(ApplicationInstance(application_id=app.id, host='h', status='down'))
+    db.session.commit()
+    rv = client.get('/api/applications?status=down')
+    assert [a['name'] for a in rv.get_json()] == ['App 3']
+    assert rv.get_json()[0]['systems'][0]['host'] == 'host3'
+
+    app.shutdown_order = 70
+    db.session.commit()
+    rv = client.get('/api/applications?status=down&fields=shutdown_order')
+    assert rv.get_json() == [{'id': app.id, 'shutdown_order': 70}]
+    assert set(client.get('/api/applications?limit=1').get_json()[0]) == set(Application.query.first().to_dict())
+
+    assert client.get('/api/applications?fields=bogus').status_code == 400
+    assert client.get('/api/applications?limit=x').status_code == 400
+
+def test_list_teams_and_systems_pagination(client):
+    _add_applications(3)
+    rv = client.get('/api/systems?limit=2&fields=host')
+    assert [s['host'] for s in rv.get_json()] == ['host0', 'host1']
+    assert 'X-Next-After' in rv.headers
+    assert len(client.get('/api/systems?status=unknown').get_json()) == 3
+    assert [t['name'] for t in client.get('/api/teams').get_json()] == ['Test Team']
+
+def test_json_provider_encodes_rows(client):
+    """Test raw SQL datetimes are encoded as ISO 8601"""
+    _add_applications(1)
+    app = client.get('/api/applications?fields=created_at').get_json()[0]
+    assert datetime.fromisoformat(app['created_at'])
+    assert client.application.json.loads(client.application.json.dumps({'a': [1]})) == {'a': [1]}
+
+def test_list_endpoints_support_conditional_get(client):
+    """Test polls get 304 until something is written"""
+    _add_applications(2)
+    rv = client.get('/api/applications')
+    etag = rv.headers['ETag']
+    assert rv.status_code == 200
+
+    rv = client.get('/api/applications', headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+    assert client.get('/api/applications?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+    client.put(f'/api/applications/{Application.query.first().id}', json={'description': 'changed'})
+    rv = client.get('/api/applications', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+
+    etag = client.get('/api/teams').headers['ETag']
+    _upload_text(client, 'name,team,host\nWeb,Web Team,web1\n')
+    assert client.get('/api/teams', headers={'If-None-Match': etag}).status_code == 200
+
+def test_summary_counts_in_sql(client, inventory, statements):
+    """Test the summary aggregates per team and status with a fixed number of queries"""
+    apps = inventory({'Web': [('web1', 80), ('web2', 80)], 'Db': [('db1', 5432)]})
+    inventory({'Batch': [('batch1', 22)]}, team='Other Team')
+    db.session.add(Team(name='Empty Team'))
+    apps['Web'].instances[0].status = 'up'
+    apps['Db'].state = 'completed'
+    db.session.commit()
+
+    del statements[:]
+    data = client.get('/api/summary').get_json()
+    assert len([s for s in statements if s.lstrip().upper().startswith('SELECT')]) <= 4
+    assert data['applications'] == 3 and data['instances'] == 4
+    assert data['statuses'] == {'up': 1, 'unknown': 3}
+    assert data['states'] == {'notStarted': 2, 'completed': 1}
+    teams = {team['name']: team for team in data['teams']}
+    assert teams['Test Team']['statuses'] == {'up': 1, 'unknown': 2}
+    assert teams['Test Team']['states'] == {'notStarted': 1, 'completed': 1}
+    assert teams['Other Team']['applications'] == 1
+    assert teams['Empty Team'] == {'id': teams['Empty Team']['id'], 'name': 'Empty Team', 'applications': 0,
+                                   'instances': 0, 'states': {}, 'statuses': {}}
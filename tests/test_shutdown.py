@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import Future
+from threading import Lock
+from app import db
+from app.models import Application, ApplicationInstance, ApplicationDependency, StatusChange
+from app.planner import shutdown_plan
+from app.shutdown import ShutdownExecutor
+
+class FakeHosts:
+    """Probe executor stand-in: hosts are up until stop() is called on them."""
+
+    def __init__(self, delay=0, stuck=()):
+        self.delay = delay
+        self.stuck = set(stuck)
+        self.down = set()
+        self.stopped = []
+        self.running = self.peak = 0
+        self._lock = Lock()
+
+    def stop(self, instance):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+            self.stopped.append(instance['host'])
+            if instance['host'] not in self.stuck:
+                self.down.add(instance['host'])
+
+    def submit(self, host, port):
+        future = Future()
+        future.set_result((host not in self.down, None))
+        return future
+
+def _chain(inventory):
+    """Three frontends that stop before one backend, which stops before a database."""
+    apps = inventory({'Web1': [('web1', 80)], 'Web2': [('web2', 80)], 'Web3': [('web3', 80)],
+                      'Backend': [('api1', 3000), ('api2', 3000)], 'Database': [('db1', 5432)]})
+    edges = [('Web1', 'Backend'), ('Web2', 'Backend'), ('Web3', 'Backend'), ('Backend', 'Database')]
+    db.session.add_all(ApplicationDependency(application=apps[before], owner=apps[after]) for before, after in edges)
+    db.session.commit()
+    return apps
+
+def test_waves_run_concurrently(client, inventory):
+    """Test each wave stops in parallel and is verified down before the next starts"""
+    apps = _chain(inventory)
+    hosts = FakeHosts(delay=0.1)
+    result = ShutdownExecutor(stop=hosts.stop, probes=hosts, workers=4, poll_interval=0).run(shutdown_plan())
+    assert hosts.peak == 3
+
+    assert result['failed'] == [] and result['skipped'] == []
+    assert len(result['completed']) == 5 and result['waves'] == 3
+    assert set(hosts.stopped[:3]) == {'web1', 'web2', 'web3'}
+    assert hosts.stopped[-1] == 'db1'
+    assert {app.state for app in Application.query} == {'completed'}
+    assert {instance.status for instance in ApplicationInstance.query} == {'down'}
+    assert all(instance.last_check for instance in ApplicationInstance.query)
+
+    logged = StatusChange.query.filter_by(entity='instance', entity_id=apps['Database'].instances[0].id)
+    assert [change.new_value for change in logged.order_by(StatusChange.id)] == ['in_progress', 'down']
+
+def test_unverified_stop_halts_the_run(client, inventory):
+    """Test an application still answering probes fails and its dependents are skipped"""
+    apps = _chain(inventory)
+    hosts = FakeHosts(stuck={'web2'})
+    result = ShutdownExecutor(stop=hosts.stop, probes=hosts, verify_timeout=0).run(shutdown_plan())
+
+    assert result['failed'] == [apps['Web2'].id]
+    assert sorted(result['completed']) == sorted([apps['Web1'].id, apps['Web3'].id])
+    assert result['skipped'] == [apps['Backend'].id, apps['Database'].id]
+    assert db.session.get(Application, apps['Web2'].id).state == 'inProgress'
+    assert apps['Web2'].instances[0].status == 'up'
+    assert apps['Backend'].state == 'notStarted'
+    assert {instance.status for instance in apps['Backend'].instances} == {'unknown'}
+
+def test_instances_stop_in_sequence_groups(client, inventory):
+    """Test instances with a higher sequence only stop once the earlier group is down"""
+    apps = inventory({'Cluster': [('node1', 80), ('node2', 80), ('node3', 80)]})
+    first, second, third = sorted(apps['Cluster'].instances, key=lambda instance: instance.id)
+    first.sequence, second.sequence, third.sequence = 2, 1, 1
+    db.session.commit()
+
+    hosts = FakeHosts()
+    ShutdownExecutor(stop=hosts.stop, probes=hosts).run(shutdown_plan())
+    assert hosts.stopped == ['node2', 'node3', 'node1']
+
+def test_shutdown_job(client, inventory):
+    """Test the job endpoint plans, runs and reports a shutdown"""
+    assert client.post('/api/shutdown_jobs', json={'applications': 'some'}).status_code == 400
+    assert client.get('/api/shutdown_jobs/missing').status_code == 404
+
+    # Nothing listens on port 1, so the probes see the instance as down straight away
+    apps = inventory({'Idle': [('127.0.0.1', 1)]})
+    rv = client.post('/api/shutdown_jobs', json={'applications': [apps['Idle'].id]})
+    assert rv.status_code == 202
+    job_id = rv.get_json()['job_id']
+    for _ in range(200):
+        job = client.get(f'/api/shutdown_jobs/{job_id}').get_json()
+        if job['state'] not in ('queued', 'running'):
+            break
+        time.sleep(0.05)
+    assert job['state'] == 'completed'
+    assert job['result']['completed'] == [apps['Idle'].id]
+    assert job['progress'] == {'waves': 1, 'applications': 1, 'wave': 1, 'completed': 1, 'failed': 0}
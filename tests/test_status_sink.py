@@ -0,0 +1,44 @@
+import time
+import pytest
+from app.status_sink import MongoStatusSink, StatusSink
+
+class RecordingCollection:
+    def __init__(self):
+        self.calls = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls.append(ops)
+
+def test_sink_flushes_on_size():
+    """Test the sink writes one bulk_write per max_batch updates"""
+    collection = RecordingCollection()
+    with MongoStatusSink(collection, max_batch=100, max_delay=60) as sink:
+        for i in range(250):
+            sink.add(i, {'status': 'UP'})
+        assert len(collection.calls) == 2
+
+    assert [len(ops) for ops in collection.calls] == [100, 100, 50]
+    assert sink.flushed == 250
+
+def test_sink_flushes_on_time():
+    """Test a stale buffer is flushed by the next add"""
+    collection = RecordingCollection()
+    sink = MongoStatusSink(collection, max_batch=100, max_delay=0)
+    sink.add(1, {'status': 'DOWN'})
+    assert len(collection.calls) == 1
+    assert sink.flush() == 0
+
+def test_sink_flushes_quiet_buffer_when_due():
+    """Test flush_due writes a buffer that has gone quiet once it is max_delay old"""
+    collection = RecordingCollection()
+    sink = MongoStatusSink(collection, max_batch=100, max_delay=0.05)
+    sink.add(1, {'status': 'UP'})
+    assert sink.flush_due() == 0
+    time.sleep(0.06)
+    assert sink.flush_due() == 1
+    assert len(collection.calls) == 1
+    assert sink.flush_due() == 0
+
+def test_sink_requires_a_writer():
+    with pytest.raises(TypeError):
+        StatusSink()